@@ -0,0 +1,109 @@
+import asyncio
+import inspect
+import os
+import traceback
+from flask import request
+from werkzeug.exceptions import NotFound, InternalServerError
+import web_scraper
+from stackoverflow_scraper import app, page_not_found
+
+# Serves the routes of stackoverflow_scraper on the event loop of the ASGI
+# server, so every request shares the scraper session, caches and limits:
+#   uvicorn asgi:application --port 5000
+
+async def application(scope, receive, send):
+    if scope["type"] == "lifespan":
+        await lifespan(receive, send)
+        return
+    if scope["type"] != "http":
+        return
+
+    # Servers without lifespan support only tell us about the loop here
+    loop = asyncio.get_running_loop()
+    if web_scraper.scraper_loop is not loop:
+        web_scraper.set_loop(loop)
+
+    body = await read_body(receive)
+    response = await dispatch(scope, body)
+    await send_response(response, send)
+
+async def lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message["type"] == "lifespan.startup":
+            web_scraper.set_loop(asyncio.get_running_loop())
+            web_scraper.start_warmup()
+            await send({"type": "lifespan.startup.complete"})
+        elif message["type"] == "lifespan.shutdown":
+            await web_scraper.shutdown()
+            web_scraper.set_loop(None)
+            await send({"type": "lifespan.shutdown.complete"})
+            return
+
+async def read_body(receive):
+    # The body comes in http.request messages until one says there is no more
+    chunks = []
+    while True:
+        message = await receive()
+        if message["type"] != "http.request":
+            break
+        chunks.append(message.get("body", b""))
+        if not message.get("more_body"):
+            break
+    return b"".join(chunks)
+
+async def dispatch(scope, body=b""):
+    # Run the Flask view in a request context, so the validation in
+    # stackoverflow_scraper reads the arguments like it does under Flask
+    headers = [(name.decode("latin-1"), value.decode("latin-1")) for name, value in scope["headers"]]
+    with app.test_request_context(scope["path"], method=scope["method"], query_string=scope["query_string"].decode("latin-1"), headers=headers, data=body):
+        try:
+            # The before and after request hooks run like they do under Flask
+            rv = app.preprocess_request()
+            if rv is None:
+                rv = await call_view()
+        except Exception:
+            traceback.print_exc()
+            rv = InternalServerError().get_response()
+        return app.process_response(app.make_response(rv))
+
+async def call_view():
+    if isinstance(request.routing_exception, NotFound):
+        return await page_not_found(request.routing_exception)
+    if request.routing_exception is not None:
+        return request.routing_exception.get_response()
+    rv = app.view_functions[request.url_rule.endpoint](**request.view_args)
+    if inspect.isawaitable(rv):
+        rv = await rv
+    return rv
+
+async def send_response(response, send):
+    await send({
+        "type": "http.response.start",
+        "status": response.status_code,
+        "headers": [(name.lower().encode("latin-1"), value.encode("latin-1")) for name, value in response.headers.items()]
+    })
+
+    if not response.is_streamed:
+        await send({"type": "http.response.body", "body": response.get_data()})
+        return
+
+    # Streamed responses drive the scraper through web_scraper.iter_scraper,
+    # which waits on this loop, so their chunks are made in a thread
+    chunks = iter(response.response)
+    try:
+        while True:
+            chunk = await asyncio.to_thread(next, chunks, None)
+            if chunk is None:
+                break
+            if isinstance(chunk, str):
+                chunk = chunk.encode()
+            await send({"type": "http.response.body", "body": chunk, "more_body": True})
+        await send({"type": "http.response.body", "body": b""})
+    finally:
+        await asyncio.to_thread(response.close)
+
+if __name__ == "__main__":
+    import uvicorn
+    port = int(os.getenv('STACKOVERFLOW_API_PORT', 5000))
+    uvicorn.run(application, port=port)
@@ -0,0 +1,60 @@
+import os
+import sys
+import timeit
+from bs4 import BeautifulSoup
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+import web_scraper
+from parsing import parse_html
+
+def get_body_reparse(document):
+    """get_body as it was before, serialize the body and parse it again."""
+    body = document.find(class_="s-prose js-post-body")
+    for div_tags in body.find_all('div'):
+        div_tags.decompose()
+    for emails in body.find_all(class_="__cf_email__"):
+        emails.replace_with(web_scraper.decode_cf_email(emails.get('data-cfemail')))
+    content = body.decode_contents().lstrip()
+    soup = BeautifulSoup(content, 'html.parser')
+    return ''.join(str(tag) for tag in soup)
+
+def make_post(paragraphs):
+    # A long post with the things get_body has to deal with
+    parts = ['<div class="s-prose js-post-body" itemprop="text">\n']
+    for i in range(paragraphs):
+        parts.append('<p>Paragraph %d with <code>a &lt; b &amp;&amp; c</code>, <a href="https://example.com/?a=1&amp;b=%d" rel="nofollow">a link</a> and <em>&quot;quotes&quot;</em>.</p>\n' % (i, i))
+        if i % 5 == 0:
+            parts.append('<pre class="lang-py s-code-block"><code class="hljs">for x in range(%d):\n    print(x &lt;&lt; 2)\n</code></pre>\n' % i)
+        if i % 7 == 0:
+            parts.append('<div class="snippet" data-lang="js"><div class="snippet-code"><pre><code>drop me</code></pre></div></div>\n')
+        if i % 11 == 0:
+            parts.append('<p>Mail <a href="/cdn-cgi/l/email-protection" class="__cf_email__" data-cfemail="543c3138383b14312c35392438317a373b39">[email&#160;protected]</a> now</p>\n')
+        if i % 13 == 0:
+            parts.append('Loose text &amp; more<br>\n<!-- a comment -->\n')
+    parts.append('</div>')
+    return '<html><body><div id="question">' + ''.join(parts) + '</div></body></html>'
+
+def main():
+    for paragraphs in [10, 100, 1000]:
+        page = make_post(paragraphs)
+
+        # Both need a fresh tree, get_body changes the one it is given
+        old = get_body_reparse(parse_html(page))
+        new = web_scraper.get_body(parse_html(page))
+        if old != new:
+            print("Output differs for %d paragraphs" % paragraphs)
+            return
+
+        number = max(1, 2000 // paragraphs)
+        old_time = timeit.timeit(lambda: get_body_reparse(parse_html(page)), number=number) / number
+        new_time = timeit.timeit(lambda: web_scraper.get_body(parse_html(page)), number=number) / number
+        parse_time = timeit.timeit(lambda: parse_html(page), number=number) / number
+
+        # The page has to be parsed either way, compare what get_body itself costs
+        old_body = old_time - parse_time
+        new_body = new_time - parse_time
+        print("%5d paragraphs (%7d bytes): reparse %.2f ms, single pass %.2f ms, %.1fx faster" % (
+            paragraphs, len(page), old_body * 1000, new_body * 1000, old_body / new_body))
+
+if __name__ == "__main__":
+    main()
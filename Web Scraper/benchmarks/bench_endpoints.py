@@ -0,0 +1,150 @@
+import argparse
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tarfile
+import time
+import urllib.request
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, ROOT)
+import replay
+import singleflight
+import http_cache
+import rate_limiter
+import web_scraper
+from stackoverflow_scraper import app
+
+# Drives every route with the requests of the recorded test logs, either
+# against stackoverflow.com while recording what it fetches:
+#   python benchmarks/bench_endpoints.py --record fixtures.ndjson.gz
+# or against a replay of such a recording, without touching the site:
+#   python benchmarks/bench_endpoints.py fixtures.ndjson.gz --latency 0.05
+
+ENDPOINTS = ["/questions", "/questions/<ids>", "/questions/<ids>/answers", "/answers/<ids>", "/collectives", "other"]
+
+def read_requests(path):
+    # The logs are named after the request they answer, the path separators
+    # are underscores: "_questions_1;2_answers?sort=votes" is /questions/1;2/answers?sort=votes
+    requests = []
+    with tarfile.open(path) as tar:
+        for member in tar.getmembers():
+            directory, name = os.path.split(member.name)
+            if not member.isfile() or os.path.basename(directory) != "test" or not name.endswith(".json"):
+                continue
+            path, separator, query = name[:-len(".json")].partition("?")
+            requests.append(path.replace("_", "/") + separator + query)
+    return sorted(requests)
+
+def endpoint(path):
+    parts = path.partition("?")[0].strip("/").split("/")
+    if parts[0] == "questions":
+        if len(parts) == 1:
+            return "/questions"
+        if parts[-1] == "answers":
+            return "/questions/<ids>/answers"
+        return "/questions/<ids>"
+    if parts[0] == "answers":
+        return "/answers/<ids>"
+    if parts[0] == "collectives" and len(parts) == 1:
+        return "/collectives"
+    return "other"
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def start_replay_server(archive, latency, jitter):
+    port = free_port()
+    server = subprocess.Popen([sys.executable, os.path.join(ROOT, "replay.py"), archive, "--port", str(port),
+                               "--latency", str(latency), "--jitter", str(jitter)])
+    upstream = "http://127.0.0.1:%d" % port
+    for _ in range(100):
+        try:
+            urllib.request.urlopen(upstream + "/stats")
+            return server, upstream
+        except OSError:
+            time.sleep(0.1)
+    server.kill()
+    raise RuntimeError("The replay server did not start")
+
+def reset_caches():
+    # Every request starts cold, like the first request after a restart
+    http_cache.responses.clear()
+    web_scraper.owner_cache.clear()
+    web_scraper.collectives_catalog = {}
+    web_scraper.catalog_fetched = {}
+    web_scraper.catalog_order = []
+    web_scraper.catalog_updated = 0
+
+def run(requests, rounds, cold):
+    client = app.test_client()
+    results = {name: [] for name in ENDPOINTS}
+    for _ in range(rounds):
+        for path in requests:
+            if cold:
+                reset_caches()
+            fetches = singleflight.leaders
+            cpu = time.process_time()
+            start = time.perf_counter()
+            response = client.get(path)
+            response.get_data()
+            results[endpoint(path)].append({
+                "latency": time.perf_counter() - start,
+                "cpu": time.process_time() - cpu,
+                "fetches": singleflight.leaders - fetches,
+                "error": response.status_code >= 500
+            })
+    return results
+
+def report(results):
+    print("%-26s %8s %7s %10s %10s %12s %12s" % ("endpoint", "requests", "errors", "p50 ms", "max ms", "fetches/req", "cpu ms/req"))
+    for name in ENDPOINTS:
+        runs = results[name]
+        if not runs:
+            continue
+        latencies = [run["latency"] * 1000 for run in runs]
+        print("%-26s %8d %7d %10.1f %10.1f %12.1f %12.1f" % (
+            name, len(runs), sum(run["error"] for run in runs), statistics.median(latencies), max(latencies),
+            statistics.mean(run["fetches"] for run in runs), statistics.mean(run["cpu"] * 1000 for run in runs)))
+
+def main():
+    parser = argparse.ArgumentParser(description="Latency, upstream fetches and CPU time of every route")
+    parser.add_argument("archive", nargs="?", help="recorded pages to replay")
+    parser.add_argument("--record", metavar="ARCHIVE", help="fetch from stackoverflow.com and record into ARCHIVE")
+    parser.add_argument("--logs", default=os.path.join(ROOT, "24923273.tar"), help="test logs to take the requests from")
+    parser.add_argument("--latency", type=float, default=0.05, help="seconds the replay server holds every response back")
+    parser.add_argument("--jitter", type=float, default=0.0)
+    parser.add_argument("--rounds", type=int, default=1)
+    parser.add_argument("--warm", action="store_true", help="keep the caches between requests")
+    parser.add_argument("--polite", action="store_true", help="keep the rate governors when replaying")
+    args = parser.parse_args()
+    if not args.archive and not args.record:
+        parser.error("give an archive to replay or --record")
+
+    requests = read_requests(args.logs)
+    server = None
+    if args.record:
+        replay.RECORD_PATH = args.record
+    else:
+        server, replay.UPSTREAM = start_replay_server(args.archive, args.latency, args.jitter)
+        if not args.polite:
+            # The replay server is not the site, there is no rate to keep to
+            rate_limiter.RATE_START = rate_limiter.RATE_MAX = rate_limiter.RATE_BURST = 1000000
+    try:
+        results = run(requests, args.rounds, not args.warm)
+    finally:
+        web_scraper.close_session()
+        if server is not None:
+            server.terminate()
+            server.wait()
+
+    report(results)
+    if args.record:
+        print("Recorded %d pages into %s" % (replay.recorded, args.record))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+import os
+import random
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+from query import Query
+
+# The chain a Query replaced, as it was before
+
+def sort_data(items, sort_order, order):
+    if sort_order == "votes":
+        key = 'score'
+    elif sort_order == "creation":
+        key = 'creation_date'
+    else:
+        key = 'last_activity_date'
+    return sorted(items, key=lambda x: x[key], reverse=order == "desc")
+
+def min_and_max(items, sort_order, min_, max_):
+    if not (min_ or max_):
+        return items
+    data = []
+    for item in items:
+        if sort_order == "votes":
+            votes = item['score']
+            if min_ and max_:
+                if int(min_) <= int(votes) <= int(max_):
+                    data.append(item)
+            elif min_:
+                if int(votes) >= int(min_):
+                    data.append(item)
+            elif int(votes) <= int(max_):
+                data.append(item)
+        else:
+            date = item['creation_date'] if sort_order == "creation" else item['last_activity_date']
+            if min_ and max_:
+                if int(min_) <= int(date) < int(max_):
+                    data.append(item)
+            elif min_:
+                if int(date) >= int(min_):
+                    data.append(item)
+            elif int(date) < int(max_):
+                data.append(item)
+    return data
+
+def from_and_to_date(items, fromdate, todate):
+    if not (fromdate or todate):
+        return items
+    data = []
+    for item in items:
+        date = item['creation_date']
+        if fromdate and todate:
+            if int(fromdate) <= int(date) < int(todate):
+                data.append(item)
+        elif fromdate:
+            if int(date) >= int(fromdate):
+                data.append(item)
+        elif int(date) < int(todate):
+            data.append(item)
+    return data
+
+def pages(items, page_number, page_size):
+    data = []
+    has_more = False
+    count = 0
+    page_count = (int(page_size) * int(page_number)) - int(page_size)
+    if items:
+        for i in range(int(page_size)):
+            if (page_count+i) < len(items):
+                data.append(items[page_count + i])
+                count += 1
+        if (page_count+count) < len(items):
+            has_more = True
+    return data, has_more
+
+def chain(items, sort_order, order, page_number, page_size, fromdate, todate, min_, max_):
+    sorted_data = from_and_to_date(items, fromdate, todate)
+    sorted_data = min_and_max(sorted_data, sort_order, min_, max_)
+    sorted_data = sort_data(sorted_data, sort_order, order)
+    return pages(sorted_data, page_number, page_size)
+
+def make_items(count):
+    # Posts with few distinct scores, so that the order of ties matters
+    rng = random.Random(count)
+    start = 1200000000
+    items = []
+    for i in range(count):
+        created = start + rng.randrange(400000000)
+        items.append({
+            "score": rng.randrange(-5, 200),
+            "last_activity_date": created + rng.randrange(50000000),
+            "creation_date": created,
+            "question_id": i
+        })
+    return items
+
+CASES = [
+    ("votes desc, first page", ["votes", "desc", "1", "30", None, None, None, None]),
+    ("activity asc, page 10 of 100", ["activity", "asc", "10", "100", None, None, None, None]),
+    ("creation desc, fromdate/todate", ["creation", "desc", "2", "50", "1300000000", "1500000000", None, None]),
+    ("votes asc, min/max", ["votes", "asc", "3", "30", None, None, "20", "120"])
+]
+
+def main():
+    for count in [100, 1000, 10000, 100000]:
+        items = make_items(count)
+        print("%d items" % count)
+        for name, params in CASES:
+            sort_order, order, page_number, page_size, fromdate, todate, min_, max_ = params
+            old = chain(items, *params)
+            new = Query(sort_order, order, page_number, page_size, fromdate, todate, min_, max_).run(items)
+            if old != new:
+                print("Output differs for %s" % name)
+                return
+
+            number = max(1, 200000 // count)
+            old_time = timeit.timeit(lambda: chain(items, *params), number=number) / number
+            new_time = timeit.timeit(lambda: Query(sort_order, order, page_number, page_size, fromdate, todate, min_, max_).run(items), number=number) / number
+            print("  %-32s chain %8.2f ms, query %8.2f ms, speedup %.1fx" % (name, old_time * 1000, new_time * 1000, old_time / new_time))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,179 @@
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from urllib.parse import urlparse, parse_qs
+from aiohttp import web
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+import replay
+import store
+import http_cache
+import rate_limiter
+import web_scraper
+
+# Upstream fetches of a store refresh against scraping every question
+# again, on a made up site served in place of stackoverflow.com:
+#   python benchmarks/bench_refresh.py --questions 100 --moved 5
+
+QUESTION = """<html><head><script>StackExchange.ready(function(){StackExchange.question.init({questionId: %(id)d});});</script></head><body>
+<div id="question-header"><h1><a href="/questions/%(id)d/title" class="question-hyperlink">Question %(id)d</a></h1></div>
+<div><div class="flex--item ws-nowrap mb8" title="Viewed 1,234 times">Viewed</div><a class="s-link s-link__inherit" title="%(active)s">active</a></div>
+<div id="question"><div class="js-vote-count flex--item d-flex fd-column ai-center fc-theme-body-font fw-bold fs-subheading py4">%(score)d</div>
+<div class="s-prose js-post-body"><p>Body of %(id)d</p></div>
+<ul><li class="d-inline mr4 js-post-tag-list-item"><a>python</a></li></ul>
+<div class="user-action-time fl-grow1">asked <time datetime="%(created)s">x</time></div></div>
+<div id="answers"><div id="answers-header"><h2 class="mb0" data-answercount="1">1 Answer</h2></div>
+<div id="answer-%(answer)d" class="answer js-answer" data-answerid="%(answer)d" data-parentid="%(id)d" data-score="1">
+<div class="js-accepted-answer-indicator flex--item fc-green-400 py6 mtn8 d-none"></div>
+<div class="s-prose js-post-body"><p>Answer to %(id)d</p></div><div class="user-action-time fl-grow1">answered</div></div></div>
+</body></html>"""
+
+TIMELINE = """<html><body><div class="subheader mb16 d-flex fd-column h-auto"><h3>License <a>CC BY-SA 4.0</a></h3></div>
+<table><tbody class="event-rows fs-body">
+<tr><td><span class="relativetime" title="%(active)s">x</span></td><td class="wmn1">asked</td><td><a class="owner" href="/users/1/alice">alice</a></td><td class="event-comment"></td></tr>
+<tr><td><span class="relativetime" title="%(active)s">x</span></td><td class="wmn1">answered</td><td>bob</td><td class="event-comment"></td></tr>
+</tbody></table></body></html>"""
+
+PROFILE = """<html><head><link rel="canonical" href="https://stackoverflow.com/users/1/alice">
+<script>StackExchange.ready(function(){StackExchange.user.init({ userId: 1, accountId: 99 });});</script></head>
+<body><img class="bar-sm bar-md d-block" src="https://example.com/a.png">
+<div id="stats"><div class="fs-body3 fc-black-600">12,345</div></div></body></html>"""
+
+class Site:
+    """Questions whose last activity can be moved, and the pages that show them."""
+
+    def __init__(self, count):
+        now = int(time.time())
+        self.ids = [1000 + i for i in range(count)]
+        self.created = {id: now - 86400 * (count + 10 - i) for i, id in enumerate(self.ids)}
+        self.active = {id: self.created[id] + 3600 for id in self.ids}
+        self.served = 0
+
+    def move(self, ids):
+        now = int(time.time())
+        for offset, id in enumerate(ids):
+            self.active[id] = now - offset
+
+    def question(self, id):
+        return QUESTION % {
+            "id": id,
+            "answer": id * 10 + 1,
+            "score": id % 50,
+            "created": stamp(self.created[id], "%Y-%m-%dT%H:%M:%S"),
+            "active": stamp(self.active[id], "%Y-%m-%d %H:%M:%SZ")
+        }
+
+    def listing(self, page_size, page_number):
+        # The active tab, most recently active first
+        order = sorted(self.ids, key=lambda id: -self.active[id])
+        start = (page_number - 1) * page_size
+        summaries = "".join(
+            '<div class="s-post-summary js-post-summary" data-post-id="%d"><h3 class="s-post-summary--content-title"><a href="/questions/%d/t">x</a></h3>'
+            '<time class="s-user-card--time">modified <span title="%s" class="relativetime">x</span></time></div>' % (id, id, stamp(self.active[id], "%Y-%m-%d %H:%M:%SZ"))
+            for id in order[start:start + page_size])
+        return '<html><body><div id="questions">%s</div></body></html>' % summaries
+
+    def question_of(self, id):
+        # Answers have the id of their question with a digit added
+        return id if id in self.active else id // 10
+
+    def page(self, url):
+        parsed = urlparse(url)
+        parts = parsed.path.strip("/").split("/")
+        if parts[0] == "posts":
+            return TIMELINE % {"active": stamp(self.active[self.question_of(int(parts[1]))], "%Y-%m-%d %H:%M:%SZ")}
+        if parts[0] == "users":
+            return PROFILE
+        if parts[0] == "questions" and len(parts) > 1:
+            return self.question(self.question_of(int(parts[1])))
+        query = parse_qs(parsed.query)
+        return self.listing(int(query.get("pagesize", ["15"])[0]), int(query.get("page", ["1"])[0]))
+
+def stamp(seconds, format):
+    return datetime.fromtimestamp(seconds, timezone.utc).strftime(format)
+
+async def start_site(site):
+    async def serve(request):
+        site.served += 1
+        return web.Response(text=site.page(request.query["url"]), content_type="text/html")
+
+    app = web.Application()
+    app.router.add_get("/replay", serve)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    server = web.TCPSite(runner, "127.0.0.1", 0)
+    await server.start()
+    port = runner.addresses[0][1]
+    return runner, "http://127.0.0.1:%d" % port
+
+def reset_caches():
+    # Nothing is served from memory, every phase starts cold
+    http_cache.responses.clear()
+    web_scraper.owner_cache.clear()
+
+def scrape(site, call):
+    # Upstream fetches and seconds taken by one call on the scraper loop
+    reset_caches()
+    served = site.served
+    start = time.perf_counter()
+    result = asyncio.run_coroutine_threadsafe(call, web_scraper.get_loop()).result()
+    return result, site.served - served, time.perf_counter() - start
+
+def chunks(ids, size):
+    for start in range(0, len(ids), size):
+        yield ";".join(str(id) for id in ids[start:start + size])
+
+async def fill(ids):
+    # Every question and its answer, as withbody requests leave them in the store
+    params = ["activity", "desc", "1", "100", None, None, None, None, None]
+    for chunk in chunks(ids, 100):
+        await web_scraper.get_question_ids(chunk, list(params), "withbody")
+        await web_scraper.get_answer_ids(";".join(str(int(id) * 10 + 1) for id in chunk.split(";")), list(params), "withbody")
+
+async def read_all(ids):
+    params = ["activity", "desc", "1", "100", None, None, None, None, None]
+    items = []
+    for chunk in chunks(ids, 100):
+        items += (await web_scraper.get_question_ids(chunk, list(params), "withbody"))["items"]
+    return items
+
+def main():
+    parser = argparse.ArgumentParser(description="Upstream fetches of a store refresh against a full re-scrape")
+    parser.add_argument("--questions", type=int, default=100)
+    parser.add_argument("--moved", type=int, default=5, help="questions that get new activity between the scrapes")
+    args = parser.parse_args()
+
+    site = Site(args.questions)
+    loop = web_scraper.get_loop()
+    runner, replay.UPSTREAM = asyncio.run_coroutine_threadsafe(start_site(site), loop).result()
+    rate_limiter.RATE_START = rate_limiter.RATE_MAX = rate_limiter.RATE_BURST = 1000000
+    directory = tempfile.mkdtemp()
+    store.STORE_PATH = os.path.join(directory, "store.db")
+
+    try:
+        _, filled, fill_time = scrape(site, fill(site.ids))
+        print("%-34s %6d fetches %8.2f s" % ("filling the store", filled, fill_time))
+
+        # Spread the moved questions over the listing, they all go to its front
+        step = max(1, args.questions // max(1, args.moved))
+        site.move(site.ids[::step][:args.moved])
+
+        _, refreshed, refresh_time = scrape(site, web_scraper.refresh_store(None))
+        print("%-34s %6d fetches %8.2f s  %s" % ("refreshing the store", refreshed, refresh_time, web_scraper.refresh_stats))
+        from_store, served, _ = scrape(site, read_all(site.ids))
+        print("%-34s %6d fetches" % ("reading every question", served))
+
+        store.STORE_PATH = ""
+        rescraped, rescrape_fetches, rescrape_time = scrape(site, read_all(site.ids))
+        print("%-34s %6d fetches %8.2f s" % ("scraping every question again", rescrape_fetches, rescrape_time))
+        print("Refreshed store matches the re-scrape: %s" % (from_store == rescraped))
+    finally:
+        asyncio.run_coroutine_threadsafe(runner.cleanup(), loop).result()
+        web_scraper.close_session()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+import time
+from collections import OrderedDict
+
+class TTLCache:
+    """In-memory cache that drops entries after ttl seconds and evicts the least recently used when full."""
+
+    def __init__(self, maxsize, ttl):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        entry = self.entries.get(key)
+        if entry is not None:
+            value, expires = entry
+            if expires > time.monotonic():
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return value
+            del self.entries[key]
+
+        self.misses += 1
+        return None
+
+    def peek(self, key):
+        # Like get, but does not count as a lookup or mark the entry as used
+        entry = self.entries.get(key)
+        if entry is not None and entry[1] > time.monotonic():
+            return entry[0]
+        return None
+
+    def touch(self, key):
+        # Mark the entry as recently used without counting a lookup
+        if key in self.entries:
+            self.entries.move_to_end(key)
+
+    def set(self, key, value):
+        if self.maxsize <= 0:
+            return
+        self.entries[key] = (value, time.monotonic() + self.ttl)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.maxsize:
+            self.entries.popitem(last=False)
+
+    def clear(self):
+        self.entries.clear()
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self.entries),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else 0.0
+        }
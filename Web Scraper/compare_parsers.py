@@ -0,0 +1,74 @@
+import os
+import sys
+import web_scraper
+import replay
+from parsing import parse_html
+
+# Checks that a parser gives the same output as html.parser for every
+# extractor. The pages are read from an archive recorded with replay.py,
+# which a run of the endpoint benchmark against the site makes:
+#   python benchmarks/bench_endpoints.py --record pages.ndjson.gz
+#   python compare_parsers.py pages.ndjson.gz lxml
+# or from a directory of html files
+
+# Extractors that only need the parsed page
+EXTRACTORS = {
+    "tags": web_scraper.get_tags,
+    "title": web_scraper.get_title,
+    "question_id": web_scraper.get_q_id,
+    "stats": web_scraper.get_stats,
+    "dates": web_scraper.get_dates,
+    "is_wiki": web_scraper.get_is_wiki,
+    "bounty": web_scraper.get_bounty,
+    "body": web_scraper.get_body,
+    "timeline": lambda doc: web_scraper.get_timeline_info(web_scraper.read_timeline(doc), True),
+    "answers_timeline": lambda doc: web_scraper.get_answers_timeline(web_scraper.read_timeline(doc), True, True)
+}
+
+def extract_all(page, parser):
+    """Run every extractor on the page, an extractor that does not apply records its error."""
+    results = {}
+    for name, extractor in EXTRACTORS.items():
+        try:
+            results[name] = extractor(parse_html(page, parser))
+        except Exception as e:
+            results[name] = type(e).__name__
+    return results
+
+def read_pages(source):
+    # (name, page) of every page in the archive or directory
+    if not os.path.isdir(source):
+        return sorted(replay.load_archive(source).items())
+    pages = []
+    for file_name in sorted(os.listdir(source)):
+        with open(os.path.join(source, file_name), 'r', encoding='utf-8') as file:
+            pages.append((file_name, file.read()))
+    return pages
+
+def compare_page(page, parser):
+    expected = extract_all(page, "html.parser")
+    actual = extract_all(page, parser)
+    return {name: (expected[name], actual[name]) for name in EXTRACTORS if expected[name] != actual[name]}
+
+def main():
+    if len(sys.argv) < 2:
+        print("Usage: python compare_parsers.py ARCHIVE_OR_DIRECTORY [PARSER]")
+        sys.exit(2)
+    source = sys.argv[1]
+    parser = sys.argv[2] if len(sys.argv) > 2 else 'lxml'
+
+    pages = read_pages(source)
+    identical = True
+    for name, page in pages:
+        differences = compare_page(page, parser)
+        if differences:
+            identical = False
+            print("Differences found in %s:" % name)
+            for name, (expected, actual) in differences.items():
+                print("  %s: html.parser=%r %s=%r" % (name, expected, parser, actual))
+
+    if identical:
+        print("The %s output is identical to html.parser on %d pages." % (parser, len(pages)))
+
+if __name__ == "__main__":
+    main()
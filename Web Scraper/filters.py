@@ -0,0 +1,141 @@
+import base64
+import binascii
+import re
+
+BUILTIN_FILTERS = ["default", "withbody", "none", "total"]
+NAME_PATTERN = re.compile(r"![A-Za-z0-9_-]+")
+
+# Upstream pages every field is read from, on top of the page the post is on:
+# "timeline" is the timeline of the post, "profile" the profile of its owner
+# and "collectives" the home pages of the collectives it mentions
+FIELDS = {
+    "question": {
+        "tags": [],
+        "migrated_from": ["timeline"],
+        "owner": ["timeline", "profile"],
+        "is_answered": [],
+        "view_count": [],
+        "bounty_amount": [],
+        "bounty_closes_date": [],
+        "protected_date": ["timeline"],
+        "closed_date": ["timeline"],
+        "accepted_answer_id": [],
+        "answer_count": [],
+        "community_owned_date": ["timeline"],
+        "score": [],
+        "locked_date": ["timeline"],
+        "last_activity_date": [],
+        "creation_date": [],
+        "last_edit_date": [],
+        "question_id": [],
+        "link": [],
+        "closed_reason": ["timeline"],
+        "title": [],
+        "body": []
+    },
+    "answer": {
+        "recommendations": ["collectives", "timeline"],
+        "posted_by_collectives": ["collectives"],
+        "owner": ["timeline", "profile"],
+        "is_accepted": [],
+        "community_owned_date": ["timeline"],
+        "score": [],
+        "last_activity_date": ["timeline"],
+        "last_edit_date": [],
+        "creation_date": ["timeline"],
+        "answer_id": [],
+        "question_id": [],
+        "body": []
+    },
+    "collective": {
+        "tags": [],
+        "external_links": [],
+        "description": [],
+        "link": [],
+        "name": [],
+        "slug": []
+    }
+}
+
+class Filter:
+    """Custom filter, the "type.field" names to include in the response."""
+
+    def __init__(self, fields, fetched=()):
+        self.fields = frozenset(fields)
+        # Fields that are not returned but still have to be scraped, to sort on
+        self.fetched = self.fields | frozenset(fetched)
+
+    @property
+    def name(self):
+        # The filter is its own name, so it keeps working across restarts
+        encoded = base64.urlsafe_b64encode(";".join(sorted(self.fields)).encode()).decode()
+        return "!" + encoded.rstrip("=")
+
+def all_fields(base):
+    fields = []
+    if base == "none":
+        return fields
+    for kind, kind_fields in FIELDS.items():
+        for field in kind_fields:
+            if field != "body" or base == "withbody":
+                fields.append(kind + "." + field)
+    return fields
+
+def check_field(field):
+    kind, _, name = field.partition(".")
+    if name not in FIELDS.get(kind, {}):
+        raise ValueError("Unknown field %s" % field)
+
+def create(include, exclude, base):
+    if base not in ["default", "withbody", "none"]:
+        raise ValueError("Unknown base %s" % base)
+    for field in include + exclude:
+        check_field(field)
+
+    fields = set(all_fields(base)) | set(include)
+    if not fields - set(exclude):
+        # It would have no name parse takes back, the none filter is this one
+        raise ValueError("No fields left to include, use the none filter")
+    return Filter(fields - set(exclude))
+
+def parse(name):
+    # A built-in filter stays a string, a custom one becomes a Filter
+    if name in BUILTIN_FILTERS:
+        return name
+    if not NAME_PATTERN.fullmatch(name):
+        raise ValueError("Invalid filter specified")
+
+    encoded = name[1:]
+    try:
+        decoded = base64.b64decode(encoded + "=" * (-len(encoded) % 4), altchars=b"-_", validate=True).decode()
+    except (binascii.Error, UnicodeDecodeError):
+        raise ValueError("Invalid filter specified")
+
+    fields = [field for field in decoded.split(";") if field]
+    if not fields:
+        raise ValueError("Invalid filter specified")
+    for field in fields:
+        check_field(field)
+    return Filter(fields)
+
+def fetching(filter_, kind, fields):
+    # Also scrape these fields of kind, they are needed to sort and filter on
+    if not isinstance(filter_, Filter):
+        return filter_
+    return Filter(filter_.fields, filter_.fetched | {kind + "." + field for field in fields})
+
+def includes(filter_, kind, field):
+    if isinstance(filter_, Filter):
+        return kind + "." + field in filter_.fetched
+    return field != "body" or filter_ == "withbody"
+
+def needs(filter_, kind, page):
+    # Whether any field of kind the filter asks for is read from page
+    if not isinstance(filter_, Filter):
+        return True
+    return any(page in FIELDS[kind][field] for field in FIELDS[kind] if kind + "." + field in filter_.fetched)
+
+def project(item, filter_, kind):
+    if not isinstance(filter_, Filter):
+        return item
+    return {key: value for key, value in item.items() if kind + "." + key in filter_.fields}
@@ -0,0 +1,107 @@
+import os
+import re
+import time
+from urllib.parse import urlparse
+from cache import TTLCache
+
+# Number of responses to keep and how long to keep them around for revalidation
+HTTP_CACHE_SIZE = int(os.getenv('STACKOVERFLOW_HTTP_CACHE_SIZE', 500))
+HTTP_CACHE_RETAIN = int(os.getenv('STACKOVERFLOW_HTTP_CACHE_RETAIN', 24 * 3600))
+
+# Seconds a response of every class of url is used without asking upstream again
+URL_CLASS_TTLS = {
+    "question": int(os.getenv('STACKOVERFLOW_TTL_QUESTION', 300)),
+    "timeline": int(os.getenv('STACKOVERFLOW_TTL_TIMELINE', 600)),
+    "user": int(os.getenv('STACKOVERFLOW_TTL_USER', 3600)),
+    "collective": int(os.getenv('STACKOVERFLOW_TTL_COLLECTIVE', 24 * 3600)),
+    "listing": int(os.getenv('STACKOVERFLOW_TTL_LISTING', 60)),
+    "other": int(os.getenv('STACKOVERFLOW_TTL_OTHER', 300))
+}
+
+responses = TTLCache(HTTP_CACHE_SIZE, HTTP_CACHE_RETAIN)
+fresh_hits = 0
+fresh_misses = 0
+revalidations = 0
+not_modified = 0
+
+def url_class(url):
+    parsed = urlparse(url)
+    path = parsed.path
+    if re.match(r'^/posts/\d+/timeline', path):
+        return "timeline"
+    if path.startswith("/users/"):
+        return "user"
+    if path.startswith("/collectives") or "collective" in parsed.query:
+        return "collective"
+    if re.match(r'^/questions/\d+', path):
+        return "question"
+    if path in ["", "/", "/questions"] or path.startswith("/questions/tagged/"):
+        return "listing"
+    return "other"
+
+def get_fresh(url):
+    # Body of the cached response if it is still fresh enough to use as is.
+    # A stale entry is kept for revalidation but counts as a miss here
+    global fresh_hits, fresh_misses
+    entry = responses.peek(url)
+    if entry and time.monotonic() - entry["fetched"] < URL_CLASS_TTLS[url_class(url)]:
+        responses.touch(url)
+        fresh_hits += 1
+        return entry["body"]
+    fresh_misses += 1
+    return None
+
+def conditional_headers(url):
+    # Headers that let upstream answer 304 if the cached response did not
+    # change, together with the cached body to use when it does
+    global revalidations
+    headers = {}
+    entry = responses.peek(url)
+    if entry is None:
+        return headers, None
+
+    if entry["etag"]:
+        headers["If-None-Match"] = entry["etag"]
+    if entry["last_modified"]:
+        headers["If-Modified-Since"] = entry["last_modified"]
+    if not headers:
+        return headers, None
+
+    revalidations += 1
+    return headers, entry
+
+def revalidated(url, entry):
+    # Upstream answered 304, the cached body is fresh again
+    global not_modified
+    not_modified += 1
+    entry["fetched"] = time.monotonic()
+    responses.set(url, entry)
+    return entry["body"]
+
+def expire(url):
+    # The page is known to have changed, ask upstream again the next time.
+    # The entry stays for revalidation, a 304 still saves the body
+    entry = responses.peek(url)
+    if entry is not None:
+        entry["fetched"] = float("-inf")
+
+def store(url, body, headers):
+    if "no-store" in headers.get("Cache-Control", ""):
+        return
+    responses.set(url, {
+        "body": body,
+        "etag": headers.get("ETag"),
+        "last_modified": headers.get("Last-Modified"),
+        "fetched": time.monotonic()
+    })
+
+def stats():
+    # The entries are only peeked at, hits and misses are counted by freshness
+    data = responses.stats()
+    lookups = fresh_hits + fresh_misses
+    data["hits"] = fresh_hits
+    data["misses"] = fresh_misses
+    data["hit_ratio"] = fresh_hits / lookups if lookups else 0.0
+    data["revalidations"] = revalidations
+    data["not_modified"] = not_modified
+    return data
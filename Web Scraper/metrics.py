@@ -0,0 +1,103 @@
+import bisect
+import functools
+import threading
+import time
+import timing
+
+# Counters and histograms in the Prometheus text format, kept by hand so
+# that the scraper does not need a client library
+
+LATENCY_BUCKETS = [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60]
+PARSE_BUCKETS = [0.0001, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1]
+
+METRICS = {
+    "stackoverflow_upstream_fetches_total": ("counter", "Responses from upstream by url class and status", None),
+    "stackoverflow_upstream_bytes_total": ("counter", "Bytes of response bodies downloaded from upstream", None),
+    "stackoverflow_upstream_retries_total": ("counter", "Fetches tried again after an error", None),
+    "stackoverflow_upstream_throttled_total": ("counter", "429 responses seen from upstream", None),
+    "stackoverflow_rate_limit_wait_seconds": ("histogram", "Time fetches waited on the rate governor of their host", LATENCY_BUCKETS),
+    "stackoverflow_semaphore_wait_seconds": ("histogram", "Time fetches waited for one of the concurrent request slots", LATENCY_BUCKETS),
+    "stackoverflow_parse_seconds": ("histogram", "Time spent in every parser and extractor", PARSE_BUCKETS),
+    "stackoverflow_request_duration_seconds": ("histogram", "Time taken to answer a request by route", LATENCY_BUCKETS)
+}
+
+lock = threading.Lock()
+counters = {}
+histograms = {}
+
+def labels_key(labels):
+    return tuple(sorted(labels.items()))
+
+def inc(name, amount=1, **labels):
+    key = (name, labels_key(labels))
+    with lock:
+        counters[key] = counters.get(key, 0) + amount
+
+def observe(name, value, **labels):
+    key = (name, labels_key(labels))
+    buckets = METRICS[name][2]
+    with lock:
+        histogram = histograms.get(key)
+        if histogram is None:
+            histogram = histograms[key] = {
+                "counts": [0] * (len(buckets) + 1),
+                "sum": 0.0
+            }
+        # counts[i] holds the observations in bucket i alone, they are summed up when rendered
+        histogram["counts"][bisect.bisect_left(buckets, value)] += 1
+        histogram["sum"] += value
+
+def timed(function):
+    """Observe how long the decorated parser or extractor takes, as stackoverflow_parse_seconds and in the request's timings."""
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            elapsed = time.perf_counter() - start
+            observe("stackoverflow_parse_seconds", elapsed, extractor=function.__name__)
+            timing.add(timing.EXTRACTOR_STAGES.get(function.__name__, "extract"), elapsed)
+    return wrapper
+
+def format_labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ""
+    escaped = ('%s="%s"' % (name, str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")) for name, value in pairs)
+    return "{" + ",".join(escaped) + "}"
+
+def format_value(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+def render(collected=()):
+    """All the metrics in the Prometheus text format, with values read at render time as (name, kind, help, {labels: value})."""
+    with lock:
+        counter_items = sorted(counters.items())
+        histogram_items = sorted((key, dict(counts=list(h["counts"]), sum=h["sum"])) for key, h in histograms.items())
+
+    lines = []
+    for name, (kind, help_text, buckets) in METRICS.items():
+        lines.append("# HELP %s %s" % (name, help_text))
+        lines.append("# TYPE %s %s" % (name, kind))
+        if kind == "counter":
+            for (metric, labels), value in counter_items:
+                if metric == name:
+                    lines.append("%s%s %s" % (name, format_labels(labels), format_value(value)))
+            continue
+        for (metric, labels), histogram in histogram_items:
+            if metric != name:
+                continue
+            total = 0
+            for bound, count in zip(buckets + ["+Inf"], histogram["counts"]):
+                total += count
+                lines.append("%s_bucket%s %d" % (name, format_labels(labels, [("le", bound)]), total))
+            lines.append("%s_sum%s %s" % (name, format_labels(labels), repr(histogram["sum"])))
+            lines.append("%s_count%s %d" % (name, format_labels(labels), total))
+
+    for name, kind, help_text, values in collected:
+        lines.append("# HELP %s %s" % (name, help_text))
+        lines.append("# TYPE %s %s" % (name, kind))
+        for labels, value in sorted(values.items()):
+            lines.append("%s%s %s" % (name, format_labels(labels), format_value(value)))
+    return "\n".join(lines) + "\n"
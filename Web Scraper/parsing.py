@@ -0,0 +1,51 @@
+import asyncio
+import os
+from bs4 import BeautifulSoup, SoupStrainer
+from bs4.builder import builder_registry
+import metrics
+
+# Tree builder used for every page, "html.parser" or the faster C-backed "lxml"
+PARSER = os.getenv('STACKOVERFLOW_PARSER', 'html.parser')
+# Pages at least this many characters long are parsed in a worker thread
+PARSE_IN_THREAD = int(os.getenv('STACKOVERFLOW_PARSE_IN_THREAD', 50000))
+
+if builder_registry.lookup(PARSER) is None:
+    raise ValueError("STACKOVERFLOW_PARSER %r is not available, install it (pip install lxml) or use html.parser" % PARSER)
+
+def get_classes(attrs):
+    classes = attrs.get("class") or ""
+    if isinstance(classes, list):
+        classes = " ".join(classes)
+    return classes
+
+def timeline_parts(name, attrs):
+    # The license subheader, the table of events and the owner link,
+    # wherever it sits, everything the timeline extractors and
+    # get_owner_info read
+    classes = get_classes(attrs)
+    if classes in ["subheader mb16 d-flex fd-column h-auto", "event-rows fs-body"]:
+        return True
+    classes = classes.split()
+    return "simultaneous" in classes or "owner" in classes
+
+def profile_parts(name, attrs):
+    # The StackExchange.user.init script, the stats, the badges and the avatar
+    if name == "script" or attrs.get("id") == "stats":
+        return True
+    classes = get_classes(attrs)
+    return "s-badge" in classes.split() or classes == "bar-sm bar-md d-block"
+
+# Only build the parts of the page that are read, the rest is skipped while parsing
+TIMELINE_PARTS = SoupStrainer(timeline_parts)
+PROFILE_PARTS = SoupStrainer(profile_parts)
+
+@metrics.timed
+def parse_html(page, parser=None, parse_only=None):
+    return BeautifulSoup(page, parser or PARSER, parse_only=parse_only)
+
+async def parse_page(page, parse_only=None):
+    # Parsing a large page takes long enough to hold up every other request
+    # on the event loop, so those are handed to a thread
+    if len(page) >= PARSE_IN_THREAD:
+        return await asyncio.to_thread(parse_html, page, None, parse_only)
+    return parse_html(page, parse_only=parse_only)
@@ -0,0 +1,85 @@
+import asyncio
+import os
+
+# Size of the queue in front of every stage, this is what gives backpressure
+STAGE_QUEUE_SIZE = int(os.getenv('STACKOVERFLOW_STAGE_QUEUE_SIZE', 16))
+
+DONE = object()
+
+async def run_pipeline(source, stages, queue_size=STAGE_QUEUE_SIZE):
+    """Run every item of source through the stages and yield the results in source order."""
+    # stages is a list of (coroutine function, number of workers). A stage that
+    # returns None drops the item, the rest of the stages are skipped for it.
+    queues = [asyncio.Queue(queue_size) for _ in range(len(stages) + 1)]
+
+    async def feed():
+        index = 0
+        async for item in source:
+            await queues[0].put((index, item))
+            index += 1
+        for _ in range(stages[0][1]):
+            await queues[0].put(DONE)
+
+    async def run_stage(position):
+        stage, workers = stages[position]
+        inbox = queues[position]
+        outbox = queues[position + 1]
+
+        async def work():
+            while True:
+                entry = await inbox.get()
+                if entry is DONE:
+                    return
+                index, item = entry
+                if item is not None:
+                    item = await stage(item)
+                await outbox.put((index, item))
+
+        await asyncio.gather(*[work() for _ in range(workers)])
+
+        # Tell the workers of the next stage (or the collector) that we are done
+        next_workers = stages[position + 1][1] if position + 1 < len(stages) else 1
+        for _ in range(next_workers):
+            await outbox.put(DONE)
+
+    tasks = [asyncio.ensure_future(feed())]
+    for position in range(len(stages)):
+        tasks.append(asyncio.ensure_future(run_stage(position)))
+    workers_done = asyncio.gather(*tasks)
+    # The error is raised from the collector below, do not report it twice
+    workers_done.add_done_callback(lambda future: future.cancelled() or future.exception())
+
+    # Results can finish out of order, hold them back until their turn
+    pending = {}
+    next_index = 0
+    outbox = queues[-1]
+    try:
+        while True:
+            if workers_done.done():
+                workers_done.result()
+                entry = await outbox.get()
+            else:
+                getter = asyncio.ensure_future(outbox.get())
+                await asyncio.wait([getter, workers_done], return_when=asyncio.FIRST_COMPLETED)
+                if not getter.done():
+                    getter.cancel()
+                    continue
+                entry = getter.result()
+
+            if entry is DONE:
+                break
+
+            index, item = entry
+            pending[index] = item
+            while next_index in pending:
+                item = pending.pop(next_index)
+                next_index += 1
+                if item is not None:
+                    yield item
+    finally:
+        # Cancelling the gather also cancels every stage that is still running
+        if not workers_done.done():
+            workers_done.cancel()
+        else:
+            for task in tasks:
+                task.cancel()
@@ -0,0 +1,93 @@
+import asyncio
+import os
+import time
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlparse
+
+# Requests per second every upstream host starts at, and the range it may move in
+RATE_START = float(os.getenv('STACKOVERFLOW_RATE_START', 2))
+RATE_MIN = float(os.getenv('STACKOVERFLOW_RATE_MIN', 0.2))
+RATE_MAX = float(os.getenv('STACKOVERFLOW_RATE_MAX', 20))
+RATE_BURST = float(os.getenv('STACKOVERFLOW_RATE_BURST', 5))  # Requests allowed back to back
+RATE_INCREASE = float(os.getenv('STACKOVERFLOW_RATE_INCREASE', 0.1))  # Requests per second gained every second without a 429
+RATE_DECREASE = float(os.getenv('STACKOVERFLOW_RATE_DECREASE', 0.5))  # Factor the rate is multiplied by on a 429
+RETRY_AFTER_DEFAULT = 60  # Seconds to pause when a 429 has no usable Retry-After
+
+class RateGovernor:
+    """Token bucket for one upstream host that adapts its rate to the 429s it sees."""
+
+    def __init__(self, host):
+        self.host = host
+        self.rate = RATE_START
+        self.tokens = RATE_BURST
+        self.updated = time.monotonic()
+        self.paused_until = 0
+        self.last_decrease = 0
+        self.throttled_count = 0
+
+    def refill(self, now):
+        if now > self.updated:
+            self.tokens = min(RATE_BURST, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+
+    async def acquire(self):
+        while True:
+            now = time.monotonic()
+            if now < self.paused_until:
+                await asyncio.sleep(self.paused_until - now)
+                continue
+
+            # Take a token, if there is none we reserve the next one and wait for it
+            self.refill(now)
+            self.tokens -= 1
+            if self.tokens >= 0:
+                return
+            await asyncio.sleep(-self.tokens / self.rate)
+
+            # A 429 while we were waiting cancels the reservation
+            if time.monotonic() >= self.paused_until:
+                return
+
+    def succeeded(self):
+        # Additive increase, spread over the requests made in one second
+        self.rate = min(RATE_MAX, self.rate + RATE_INCREASE / self.rate)
+
+    def throttled(self, retry_after):
+        now = time.monotonic()
+        self.throttled_count += 1
+        self.paused_until = max(self.paused_until, now + retry_after)
+
+        # Start again from an empty bucket once the pause is over, waiting
+        # requests lose their reservations and queue up again
+        self.tokens = 0
+        self.updated = self.paused_until
+
+        # Concurrent requests all see the same 429, only back off once for them
+        if now - self.last_decrease >= 1:
+            self.rate = max(RATE_MIN, self.rate * RATE_DECREASE)
+            self.last_decrease = now
+
+governors = {}
+
+def get_governor(url):
+    host = urlparse(url).netloc
+    if host not in governors:
+        governors[host] = RateGovernor(host)
+    return governors[host]
+
+def get_rates():
+    # Current request rate of every upstream host in requests per second
+    return {host: governor.rate for host, governor in governors.items()}
+
+def parse_retry_after(value):
+    # Retry-After is normally in seconds but may also be an HTTP date
+    if value is None:
+        return RETRY_AFTER_DEFAULT
+    try:
+        return max(0, int(value))
+    except ValueError:
+        pass
+    try:
+        return max(0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return RETRY_AFTER_DEFAULT
@@ -0,0 +1,138 @@
+import filters
+
+class Record:
+    """Base of the scraped records, every field starts out as None."""
+    __slots__ = ()
+
+    def __init__(self, **fields):
+        for name in self.__slots__:
+            setattr(self, name, fields.pop(name, None))
+        if fields:
+            raise TypeError("%s has no fields %s" % (type(self).__name__, ", ".join(fields)))
+
+    def __repr__(self):
+        fields = ", ".join("%s=%r" % (name, getattr(self, name)) for name in self.__slots__)
+        return "%s(%s)" % (type(self).__name__, fields)
+
+class Owner(Record):
+    __slots__ = ["account_id", "reputation", "user_id", "user_type", "profile_image", "display_name", "link"]
+
+    def to_item(self):
+        # Owners without a profile only have the name shown on the timeline
+        if self.user_type == "does_not_exist":
+            return {
+                "user_type": self.user_type,
+                "display_name": self.display_name
+            }
+        return {
+            "account_id": self.account_id,
+            "reputation": self.reputation,
+            "user_id": self.user_id,
+            "user_type": self.user_type,
+            "profile_image": self.profile_image,
+            "display_name": self.display_name,
+            "link": self.link
+        }
+
+class Collective(Record):
+    __slots__ = ["name", "slug", "description", "link", "external_links", "tags"]
+
+    def to_item(self):
+        return {
+            "tags": self.tags,
+            "external_links": self.external_links,
+            "description": self.description,
+            "link": self.link,
+            "name": self.name,
+            "slug": self.slug
+        }
+
+class Question(Record):
+    kind = "question"
+    __slots__ = [
+        "tags", "title", "link", "question_id", "score", "answer_count", "view_count", "accepted_answer_id",
+        "is_answered", "creation_date", "last_activity_date", "last_edit_date", "content_license",
+        "community_owned_date", "protected_date", "locked_date", "closed_date", "closed_reason",
+        "bounty_closes_date", "bounty_amount", "owner", "migrated_date", "migrated_question_id",
+        "migrated_url", "body"
+    ]
+
+    def to_item(self, filter_):
+        item = {
+            "tags": self.tags
+        }
+        if self.migrated_url:
+            item["migrated_from"] = {
+                "other_site": {
+                    "site_url": self.migrated_url
+                },
+                "on_date": self.migrated_date,
+                "question_id": self.migrated_question_id
+            }
+        if self.owner:
+            item["owner"] = self.owner.to_item()
+        item["is_answered"] = self.is_answered
+        item["view_count"] = int(self.view_count)
+        if self.bounty_amount is not None:
+            item["bounty_amount"] = int(self.bounty_amount)
+        if self.bounty_closes_date is not None:
+            item["bounty_closes_date"] = self.bounty_closes_date
+        if self.protected_date is not None:
+            item["protected_date"] = self.protected_date
+        if self.closed_date is not None:
+            item["closed_date"] = self.closed_date
+        if self.accepted_answer_id is not None:
+            item["accepted_answer_id"] = int(self.accepted_answer_id)
+        item["answer_count"] = int(self.answer_count)
+        if self.community_owned_date is not None:
+            item["community_owned_date"] = self.community_owned_date
+        item["score"] = int(self.score)
+        if self.locked_date is not None:
+            item["locked_date"] = self.locked_date
+        item["last_activity_date"] = self.last_activity_date
+        item["creation_date"] = int(self.creation_date)
+        if self.last_edit_date != self.creation_date:
+            item["last_edit_date"] = self.last_edit_date
+        item["question_id"] = int(self.question_id)
+        item["link"] = self.link
+        if self.closed_reason is not None:
+            item["closed_reason"] = self.closed_reason
+        item["title"] = self.title
+        if filters.includes(filter_, self.kind, "body"):
+            item["body"] = self.body
+
+        return item
+
+class Answer(Record):
+    kind = "answer"
+    __slots__ = [
+        "is_accepted", "score", "answer_id", "question_id", "creation_date", "last_edit_date",
+        "content_license", "last_activity_date", "community_owned_date", "owner", "recommended_by",
+        "recommendation_date", "posted_by_collectives", "body"
+    ]
+
+    def to_item(self, filter_):
+        item = {}
+        if self.recommended_by:
+            item["recommendations"] = [{
+                "collective": self.recommended_by.to_item(),
+                "creation_date": self.recommendation_date
+            }]
+        if self.posted_by_collectives:
+            item["posted_by_collectives"] = [collective.to_item() for collective in self.posted_by_collectives]
+        if self.owner:
+            item["owner"] = self.owner.to_item()
+        item["is_accepted"] = self.is_accepted
+        if self.community_owned_date is not None:
+            item["community_owned_date"] = self.community_owned_date
+        item["score"] = int(self.score)
+        item["last_activity_date"] = self.last_activity_date
+        if self.last_edit_date is not None:
+            item["last_edit_date"] = self.last_edit_date
+        item["creation_date"] = self.creation_date
+        item["answer_id"] = int(self.answer_id)
+        item["question_id"] = int(self.question_id)
+        if filters.includes(filter_, self.kind, "body"):
+            item["body"] = self.body
+
+        return item
@@ -0,0 +1,95 @@
+import argparse
+import asyncio
+import gzip
+import json
+import os
+import random
+import sys
+import threading
+from urllib.parse import quote
+from aiohttp import web
+import singleflight
+
+# Pages fetched from upstream are appended to this archive when it is set
+RECORD_PATH = os.getenv('STACKOVERFLOW_RECORD', '')
+# Replay server that answers in place of upstream, e.g. http://127.0.0.1:8765
+UPSTREAM = os.getenv('STACKOVERFLOW_UPSTREAM', '')
+
+record_lock = threading.Lock()
+recorded = 0
+
+def upstream_url(url):
+    # Where url is really fetched from, the caches and governors still see url
+    if not UPSTREAM:
+        return url
+    return UPSTREAM.rstrip("/") + "/replay?url=" + quote(url, safe="")
+
+def write_entry(entry):
+    with record_lock:
+        with gzip.open(RECORD_PATH, "at", encoding="utf-8") as file:
+            file.write(json.dumps(entry, ensure_ascii=False) + "\n")
+
+async def record(url, page):
+    """Add a fetched page to the archive, keyed the way singleflight keys it."""
+    global recorded
+    if not RECORD_PATH:
+        return
+    entry = {
+        "url": singleflight.normalize_url(url),
+        "body": page
+    }
+    await asyncio.to_thread(write_entry, entry)
+    recorded += 1
+
+def load_archive(path):
+    # Later recordings of a url win
+    pages = {}
+    with gzip.open(path, "rt", encoding="utf-8") as file:
+        for line in file:
+            entry = json.loads(line)
+            pages[entry["url"]] = entry["body"]
+    return pages
+
+def make_app(pages, latency, jitter):
+    served = {
+        "hits": 0,
+        "misses": 0
+    }
+
+    async def replay(request):
+        # Every answer takes about as long as upstream would
+        delay = latency + random.uniform(0, jitter)
+        if delay > 0:
+            await asyncio.sleep(delay)
+        url = singleflight.normalize_url(request.query.get("url", ""))
+        body = pages.get(url)
+        if body is None:
+            served["misses"] += 1
+            print("Not in the archive:", url, file=sys.stderr)
+            return web.Response(status=404, text="not recorded")
+        served["hits"] += 1
+        return web.Response(text=body, content_type="text/html")
+
+    async def stats(request):
+        return web.json_response(dict(served, pages=len(pages)))
+
+    app = web.Application()
+    app.router.add_get("/replay", replay)
+    app.router.add_get("/stats", stats)
+    return app
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve a recorded archive in place of stackoverflow.com")
+    parser.add_argument("archive")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds every response is held back")
+    parser.add_argument("--jitter", type=float, default=0.0, help="up to this many seconds more, at random")
+    args = parser.parse_args()
+
+    pages = load_archive(args.archive)
+    print("Replaying %d pages on http://%s:%d" % (len(pages), args.host, args.port))
+    web.run_app(make_app(pages, args.latency, args.jitter), host=args.host, port=args.port, print=None)
+
+if __name__ == "__main__":
+    main()
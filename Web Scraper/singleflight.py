@@ -0,0 +1,48 @@
+import asyncio
+import timing
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+
+inflight = {}
+leaders = 0
+coalesced = 0
+
+def normalize_url(url):
+    # Spellings of the same url share one key: the case of the scheme and
+    # host, the order of the query and the fragment do not matter
+    parts = urlsplit(url)
+    query = urlencode(sorted(parse_qsl(parts.query, keep_blank_values=True)))
+    return urlunsplit((parts.scheme.lower(), parts.netloc.lower(), parts.path or "/", query, ""))
+
+def forget(key, future):
+    if inflight.get(key) is future:
+        del inflight[key]
+    # Nobody may be left waiting for the result, do not report its error as never retrieved
+    if not future.cancelled():
+        future.exception()
+
+async def share(key, fetch):
+    """Await fetch() once for all the callers that ask for key while it is running."""
+    global leaders, coalesced
+    future = inflight.get(key)
+    if future is None:
+        leaders += 1
+        # The fetch reports its stages to the timings of the caller that started it
+        future = asyncio.ensure_future(fetch())
+        inflight[key] = future
+        future.add_done_callback(lambda done: forget(key, done))
+        # A caller that is cancelled does not cancel the fetch the others are waiting for
+        return await asyncio.shield(future)
+
+    # The others count the wait for it as their network time
+    coalesced += 1
+    with timing.stage("network"):
+        return await asyncio.shield(future)
+
+def stats():
+    requests = leaders + coalesced
+    return {
+        "inflight": len(inflight),
+        "fetches": leaders,
+        "coalesced": coalesced,
+        "coalesced_ratio": coalesced / requests if requests else 0.0
+    }
@@ -0,0 +1,131 @@
+import asyncio
+import json
+import logging
+import os
+import time
+import timing
+
+# Where responses are kept: "" keeps nothing, "journal" appends them to one
+# NDJSON file and "files" writes every response to a file of its own
+SINK = os.getenv('STACKOVERFLOW_SINK', '')
+SINK_PATH = os.getenv('STACKOVERFLOW_SINK_PATH', 'results')  # Journal file or directory for the files
+SINK_BATCH_SIZE = int(os.getenv('STACKOVERFLOW_SINK_BATCH_SIZE', 50))  # Responses written in one go
+SINK_FLUSH_INTERVAL = float(os.getenv('STACKOVERFLOW_SINK_FLUSH_INTERVAL', 1))  # Seconds a response may wait for its batch
+SINK_QUEUE_SIZE = int(os.getenv('STACKOVERFLOW_SINK_QUEUE_SIZE', 1000))  # Responses waiting to be written before new ones are dropped
+
+logger = logging.getLogger(__name__)
+
+FLUSH = object()  # Put on the queue to write the batch being gathered right away
+
+queue = None
+writer = None
+sequence = 0
+written = 0
+dropped = 0
+
+def write_journal(batch):
+    path = SINK_PATH if SINK_PATH.endswith(".ndjson") else SINK_PATH + ".ndjson"
+    with open(path, "a", encoding="utf-8") as file:
+        for name, stamp, number, data in batch:
+            entry = {
+                "endpoint": name,
+                "time": stamp,
+                "data": data
+            }
+            file.write(json.dumps(entry, ensure_ascii=False) + "\n")
+
+def write_files(batch):
+    os.makedirs(SINK_PATH, exist_ok=True)
+    for name, stamp, number, data in batch:
+        # Every request gets its own file, concurrent requests no longer overwrite each other
+        path = os.path.join(SINK_PATH, "%s-%d-%d.json" % (name, int(stamp), number))
+        with open(path, "w", encoding="utf-8") as file:
+            file.write(json.dumps(data, indent=4, ensure_ascii=False))
+
+SINKS = {
+    "journal": write_journal,
+    "files": write_files
+}
+
+if SINK and SINK not in SINKS:
+    raise ValueError("STACKOVERFLOW_SINK %r is not one of %s" % (SINK, ", ".join(SINKS)))
+
+def enabled():
+    return bool(SINK)
+
+def record(name, data):
+    # Hand a response to the background writer, this never waits on the disk
+    global queue, writer, sequence, dropped
+    if not SINK:
+        return
+    if queue is None:
+        queue = asyncio.Queue(SINK_QUEUE_SIZE)
+    if writer is None or writer.done():
+        writer = timing.background(write_batches(SINKS[SINK]))
+
+    sequence += 1
+    try:
+        queue.put_nowait((name, time.time(), sequence, data))
+    except asyncio.QueueFull:
+        dropped += 1
+
+async def write_batches(write):
+    global written
+    while True:
+        batch = []
+        entry = await queue.get()
+
+        # Gather whatever else comes in before the batch is due
+        deadline = time.monotonic() + SINK_FLUSH_INTERVAL
+        while entry is not FLUSH:
+            batch.append(entry)
+            timeout = deadline - time.monotonic()
+            if len(batch) >= SINK_BATCH_SIZE or timeout <= 0:
+                break
+            try:
+                entry = await asyncio.wait_for(queue.get(), timeout)
+            except asyncio.TimeoutError:
+                break
+        if entry is FLUSH:
+            queue.task_done()
+
+        # Serializing and writing happen in a thread, away from the event loop
+        try:
+            await asyncio.to_thread(write, batch)
+            written += len(batch)
+        except Exception:
+            # The batch is lost but the writer keeps going
+            logger.exception("Writing %d results failed", len(batch))
+        finally:
+            for _ in batch:
+                queue.task_done()
+
+async def close(timeout=10):
+    # Give the writer a chance to write what is still waiting, used when the app shuts down
+    global writer
+    if writer is None:
+        return
+    try:
+        await asyncio.wait_for(queue.put(FLUSH), timeout)
+        await asyncio.wait_for(queue.join(), timeout)
+    except asyncio.TimeoutError:
+        pass
+    writer.cancel()
+    writer = None
+
+def reset(loop=None):
+    # Forget the queue and the writer of a loop that is no longer used, the
+    # next record starts new ones. What the old queue still holds is lost
+    global queue, writer
+    if writer is not None and loop is not None:
+        loop.call_soon_threadsafe(writer.cancel)
+    queue = None
+    writer = None
+
+def stats():
+    return {
+        "sink": SINK or None,
+        "written": written,
+        "dropped": dropped,
+        "waiting": queue.qsize() if queue is not None else 0
+    }
@@ -1,21 +1,53 @@
-from flask import Flask, jsonify, Response, request
+from flask import Flask, jsonify, Response, request, g
 import json
 import aiohttp
 import asyncio
 import aiofiles
 import re
 import web_scraper
+import filters
+import metrics
+import timing
+import time
 import os
+import atexit
 
 app = Flask(__name__)
 app.config.update({
     "JSON_SORT_KEYS": False
 })
 
+# Close the pooled upstream session when the app shuts down
+atexit.register(web_scraper.close_session)
+
+@app.before_request
+def start_timer():
+    g.request_started = time.perf_counter()
+    # ?timing=1 reports where the time of the request went in a Server-Timing
+    # header, ?timing=debug also adds it to the JSON response
+    if request.args.get('timing'):
+        g.timings = timing.start()
+
+@app.after_request
+def observe_latency(response):
+    # Streamed responses are timed until they start
+    started = g.get("request_started")
+    if started is not None:
+        route = request.url_rule.rule if request.url_rule else "unmatched"
+        metrics.observe("stackoverflow_request_duration_seconds", time.perf_counter() - started, route=route)
+    timings = g.get("timings")
+    if timings is not None:
+        response.headers["Server-Timing"] = timings.header()
+    return response
+
 @app.route("/")
 def home():
     return ""
 
+@app.route("/metrics")
+def api_metrics():
+    return Response(metrics.render(web_scraper.collected_metrics()), mimetype="text/plain; version=0.0.4")
+
 @app.route("/questions")
 async def api_question():
     list_of_params = await get_parameters(True)
@@ -29,8 +61,27 @@ async def api_question():
     if isinstance(filter_, tuple):
         return filter_
 
-    questions = await web_scraper.get_questions(list_of_params, filter_)
-    return Response(json.dumps(questions, sort_keys=False, indent=0),mimetype='application/json;  charset=utf-8')
+    stream = await get_stream_param()
+    if isinstance(stream, tuple):
+        return stream
+
+    if stream:
+        trailer = {}
+        if filter_ in ["none", "total"]:
+            items = web_scraper.stream_result(web_scraper.get_questions(list_of_params, filter_), trailer)
+        else:
+            # Questions are sent as soon as they are scraped
+            items = web_scraper.stream_questions(list_of_params, filter_, trailer)
+        return stream_response(items, trailer, stream)
+
+    trailer = {}
+    questions = await web_scraper.run_scraper(web_scraper.get_questions(list_of_params, filter_, trailer))
+    response = json_response(questions, mimetype='application/json;  charset=utf-8')
+
+    # Served from a snapshot of the warm-up crawler, say how old it is
+    if "snapshot_age" in trailer:
+        response.headers["Age"] = str(trailer["snapshot_age"])
+    return response
 
 @app.route("/questions/<path:question_ids>")
 async def api_questions_ids(question_ids):
@@ -49,8 +100,16 @@ async def api_questions_ids(question_ids):
     if isinstance(filter_, tuple):
         return filter_
 
-    questions = await web_scraper.get_question_ids(question_ids, list_of_params, filter_)
-    return Response(json.dumps(questions, sort_keys=False, indent=0),mimetype='application/json')
+    stream = await get_stream_param()
+    if isinstance(stream, tuple):
+        return stream
+
+    if stream:
+        trailer = {}
+        return stream_response(web_scraper.stream_result(web_scraper.get_question_ids(question_ids, list_of_params, filter_), trailer), trailer, stream)
+
+    questions = await web_scraper.run_scraper(web_scraper.get_question_ids(question_ids, list_of_params, filter_))
+    return json_response(questions)
 
 @app.route("/questions/<path:question_ids>/answers")
 async def api_questions_ids_answers(question_ids):
@@ -69,8 +128,16 @@ async def api_questions_ids_answers(question_ids):
     if isinstance(filter_, tuple):
         return filter_
 
-    questions = await web_scraper.get_question_ids_answers(question_ids, list_of_params, filter_)
-    return Response(json.dumps(questions, sort_keys=False, indent=0),mimetype='application/json')
+    stream = await get_stream_param()
+    if isinstance(stream, tuple):
+        return stream
+
+    if stream:
+        trailer = {}
+        return stream_response(web_scraper.stream_result(web_scraper.get_question_ids_answers(question_ids, list_of_params, filter_), trailer), trailer, stream)
+
+    questions = await web_scraper.run_scraper(web_scraper.get_question_ids_answers(question_ids, list_of_params, filter_))
+    return json_response(questions)
 
 @app.route("/answers/<path:answer_ids>")
 async def api_answers(answer_ids):
@@ -89,8 +156,16 @@ async def api_answers(answer_ids):
     if isinstance(filter_, tuple):
         return filter_
 
-    answers = await web_scraper.get_answer_ids(answer_ids, list_of_params, filter_)
-    return Response(json.dumps(answers, sort_keys=False, indent=0),mimetype='application/json')
+    stream = await get_stream_param()
+    if isinstance(stream, tuple):
+        return stream
+
+    if stream:
+        trailer = {}
+        return stream_response(web_scraper.stream_result(web_scraper.get_answer_ids(answer_ids, list_of_params, filter_), trailer), trailer, stream)
+
+    answers = await web_scraper.run_scraper(web_scraper.get_answer_ids(answer_ids, list_of_params, filter_))
+    return json_response(answers)
 
 @app.route("/collectives")
 async def api_collectives():
@@ -101,8 +176,37 @@ async def api_collectives():
     if isinstance(filter_, tuple):
         return filter_
 
-    collectives = await web_scraper.get_collectives(filter_)
-    return Response(json.dumps(collectives, sort_keys=False, indent=0),mimetype='application/json; charset=utf-8')
+    stream = await get_stream_param()
+    if isinstance(stream, tuple):
+        return stream
+
+    if stream:
+        trailer = {}
+        return stream_response(web_scraper.stream_result(web_scraper.get_collectives(filter_), trailer), trailer, stream)
+
+    collectives = await web_scraper.run_scraper(web_scraper.get_collectives(filter_))
+    return json_response(collectives, mimetype='application/json; charset=utf-8')
+
+@app.route("/filters/create")
+async def api_filters_create():
+    include = request.args.get('include')
+    exclude = request.args.get('exclude')
+    base = request.args.get('base') or "default"
+
+    try:
+        filter_ = filters.create(include.split(";") if include else [], exclude.split(";") if exclude else [], base)
+    except ValueError as e:
+        return (await bad_parameter(str(e)))
+
+    data = {
+        "items": [{
+            "filter": filter_.name,
+            "included_fields": sorted(filter_.fields),
+            "filter_type": "safe"
+        }],
+        "has_more": False
+    }
+    return json_response(data)
 
 @app.errorhandler(404)
 async def page_not_found(e):
@@ -223,13 +327,59 @@ async def get_parameters(is_question):
 async def get_filter_param():
     filter_ = request.args.get('filter')
     if filter_:
-        if filter_ not in ["default", "withbody", "none", "total"]:
+        # Built-in filters by name, or a custom filter made by /filters/create
+        try:
+            filter_ = filters.parse(filter_)
+        except ValueError:
             return(await bad_parameter("Invalid filter specified"))
     else:
         filter_ = "default"
 
     return filter_
 
+async def get_stream_param():
+    # Stream the items as NDJSON or as a JSON array written one item at a
+    # time, asked for with ?stream= or an Accept header that wants NDJSON
+    stream = request.args.get('stream')
+    if stream:
+        if stream not in ["ndjson", "json"]:
+            return(await bad_parameter("stream"))
+    elif "application/x-ndjson" in request.headers.get('Accept', ''):
+        stream = "ndjson"
+
+    return stream
+
+def json_response(data, mimetype='application/json'):
+    timings = g.get("timings")
+    if timings is not None and request.args.get('timing') == "debug" and isinstance(data, dict):
+        data = dict(data, timing=timings.debug())
+    with timing.stage("serialize"):
+        body = json.dumps(data, sort_keys=False, indent=0)
+    return Response(body, mimetype=mimetype)
+
+def stream_response(items, trailer, stream):
+    # items is an async generator that fills in trailer (has_more, total)
+    # once it is done, which is why the trailer is sent last
+    def ndjson():
+        for item in web_scraper.iter_scraper(items):
+            yield json.dumps(item) + "\n"
+        yield json.dumps({"trailer": trailer}) + "\n"
+
+    def json_array():
+        separator = "\n"
+        yield '{"items": ['
+        for item in web_scraper.iter_scraper(items):
+            yield separator + json.dumps(item)
+            separator = ",\n"
+        yield "\n]"
+        for key, value in trailer.items():
+            yield ",\n%s: %s" % (json.dumps(key), json.dumps(value))
+        yield "\n}"
+
+    if stream == "ndjson":
+        return Response(ndjson(), mimetype='application/x-ndjson')
+    return Response(json_array(), mimetype='application/json')
+
 async def check_ids(ids):
     all_ids = ids.split(";")
     for id in all_ids:
@@ -255,4 +405,5 @@ def is_unix_timestamp(date):
 
 if __name__ =="__main__":
     port = int(os.getenv('STACKOVERFLOW_API_PORT', 5000))
+    web_scraper.start_warmup()
     app.run(debug=False, port=port)
\ No newline at end of file
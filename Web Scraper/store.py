@@ -0,0 +1,330 @@
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import time
+
+# SQLite file scraped posts are kept in, queries are answered from it while
+# they are fresh. Leaving it unset keeps nothing and scrapes every query
+STORE_PATH = os.getenv('STACKOVERFLOW_STORE', '')
+STORE_MAX_AGE = int(os.getenv('STACKOVERFLOW_STORE_MAX_AGE', 600))  # Seconds a stored post is answered from
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS questions (
+    question_id INTEGER PRIMARY KEY,
+    creation_date INTEGER,
+    last_activity_date INTEGER,
+    score INTEGER,
+    item TEXT NOT NULL,
+    scraped REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS questions_creation_date ON questions (creation_date);
+CREATE INDEX IF NOT EXISTS questions_last_activity_date ON questions (last_activity_date);
+CREATE INDEX IF NOT EXISTS questions_score ON questions (score);
+
+CREATE TABLE IF NOT EXISTS question_tags (
+    question_id INTEGER NOT NULL,
+    tag TEXT NOT NULL,
+    PRIMARY KEY (question_id, tag)
+);
+CREATE INDEX IF NOT EXISTS question_tags_tag ON question_tags (tag);
+
+CREATE TABLE IF NOT EXISTS answers (
+    answer_id INTEGER PRIMARY KEY,
+    question_id INTEGER,
+    creation_date INTEGER,
+    last_activity_date INTEGER,
+    score INTEGER,
+    item TEXT NOT NULL,
+    scraped REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS answers_question_id ON answers (question_id);
+CREATE INDEX IF NOT EXISTS answers_creation_date ON answers (creation_date);
+CREATE INDEX IF NOT EXISTS answers_last_activity_date ON answers (last_activity_date);
+CREATE INDEX IF NOT EXISTS answers_score ON answers (score);
+
+CREATE TABLE IF NOT EXISTS listings (
+    listing TEXT PRIMARY KEY,
+    has_more INTEGER NOT NULL,
+    scraped REAL NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS listing_questions (
+    listing TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    question_id INTEGER NOT NULL,
+    PRIMARY KEY (listing, position)
+);
+
+CREATE TABLE IF NOT EXISTS owners (
+    link TEXT PRIMARY KEY,
+    item TEXT NOT NULL,
+    scraped REAL NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS collectives (
+    link TEXT PRIMARY KEY,
+    position INTEGER NOT NULL,
+    item TEXT NOT NULL,
+    scraped REAL NOT NULL
+);
+"""
+
+# Table, id column and sortable columns of every kind of post
+POSTS = {
+    "question": ("questions", "question_id"),
+    "answer": ("answers", "answer_id")
+}
+SORT_COLUMNS = {
+    "votes": "score",
+    "creation": "creation_date",
+    "activity": "last_activity_date"
+}
+
+connection = None
+lock = threading.Lock()
+
+def enabled():
+    return bool(STORE_PATH)
+
+def connect():
+    global connection
+    if connection is None:
+        connection = sqlite3.connect(STORE_PATH, check_same_thread=False)
+        connection.executescript(SCHEMA)
+    return connection
+
+def close():
+    global connection
+    with lock:
+        if connection is not None:
+            connection.close()
+            connection = None
+
+async def run(function, *args):
+    # SQLite blocks, every call runs in a thread and they take turns on the connection
+    def call():
+        with lock:
+            with connect() as db:
+                return function(db, *args)
+    return await asyncio.to_thread(call)
+
+def write_questions(db, items, scraped):
+    for item in items:
+        db.execute("INSERT OR REPLACE INTO questions VALUES (?, ?, ?, ?, ?, ?)", (
+            item["question_id"], item["creation_date"], item["last_activity_date"], item["score"], json.dumps(item), scraped
+        ))
+        db.execute("DELETE FROM question_tags WHERE question_id = ?", (item["question_id"],))
+        db.executemany("INSERT OR IGNORE INTO question_tags VALUES (?, ?)", [(item["question_id"], tag) for tag in item["tags"]])
+
+def write_answers(db, items, scraped):
+    db.executemany("INSERT OR REPLACE INTO answers VALUES (?, ?, ?, ?, ?, ?, ?)", [(
+        item["answer_id"], item["question_id"], item["creation_date"], item["last_activity_date"], item["score"], json.dumps(item), scraped
+    ) for item in items])
+
+async def save_posts(kind, items):
+    # items are withbody items, they can answer every filter
+    write = write_questions if kind == "question" else write_answers
+    await run(write, items, time.time())
+
+def read_fresh_ids(db, kind, ids):
+    table, id_column = POSTS[kind]
+    placeholders = ", ".join("?" * len(ids))
+    rows = db.execute("SELECT %s FROM %s WHERE %s IN (%s) AND scraped >= ?" % (id_column, table, id_column, placeholders),
+                      [int(id) for id in ids] + [time.time() - STORE_MAX_AGE])
+    return {str(row[0]) for row in rows}
+
+async def fresh_ids(kind, ids):
+    if not ids:
+        return set()
+    return await run(read_fresh_ids, kind, ids)
+
+def range_conditions(column, sort_order, fromdate, todate, min_, max_):
+    # The same bounds as a Query
+    conditions = []
+    args = []
+    if fromdate:
+        conditions.append("p.creation_date >= ?")
+        args.append(int(fromdate))
+    if todate:
+        conditions.append("p.creation_date < ?")
+        args.append(int(todate))
+    if min_:
+        conditions.append("p.%s >= ?" % column)
+        args.append(int(min_))
+    if max_:
+        conditions.append("p.%s %s ?" % (column, "<=" if sort_order == "votes" else "<"))
+        args.append(int(max_))
+    return conditions, args
+
+def read_posts(db, kind, ids, sort_order, order, fromdate, todate, min_, max_, start, size):
+    if not ids:
+        # VALUES needs at least one row
+        return [], False
+    table, id_column = POSTS[kind]
+    column = SORT_COLUMNS.get(sort_order, "last_activity_date")
+    conditions, args = range_conditions(column, sort_order, fromdate, todate, min_, max_)
+
+    # Ties keep the order the ids were asked in, like they do in a Query
+    wanted = ", ".join("(?, ?)" for _ in ids)
+    wanted_args = [value for position, id in enumerate(ids) for value in (int(id), position)]
+    direction = "DESC" if order == "desc" else "ASC"
+    sql = "WITH wanted(id, position) AS (VALUES %s) SELECT p.item FROM wanted JOIN %s p ON p.%s = wanted.id" % (wanted, table, id_column)
+    if conditions:
+        sql += " WHERE " + " AND ".join(conditions)
+    sql += " ORDER BY p.%s %s, wanted.position LIMIT ? OFFSET ?" % (column, direction)
+
+    rows = db.execute(sql, wanted_args + args + [size + 1, start]).fetchall()
+    items = [json.loads(row[0]) for row in rows]
+    return items[:size], len(items) > size
+
+async def query_posts(kind, ids, sort_order, order, fromdate, todate, min_, max_, start, size):
+    """The page of the posts with these ids, as a Query would make it."""
+    if not ids:
+        return [], False
+    return await run(read_posts, kind, ids, sort_order, order, fromdate, todate, min_, max_, start, size)
+
+def tag_conditions(tags):
+    return ["question_id IN (SELECT question_id FROM question_tags WHERE tag = ?)" for tag in tags], list(tags)
+
+def read_activity(db, ids):
+    placeholders = ", ".join("?" * len(ids))
+    rows = db.execute("SELECT question_id, last_activity_date FROM questions WHERE question_id IN (%s)" % placeholders, [int(id) for id in ids])
+    return {str(row[0]): row[1] for row in rows}
+
+async def question_activity(ids):
+    # Last activity of the stored questions among ids, stale ones included
+    if not ids:
+        return {}
+    return await run(read_activity, ids)
+
+def read_oldest(db, tags):
+    conditions, args = tag_conditions(tags)
+    sql = "SELECT MIN(scraped) FROM questions WHERE " + " AND ".join(["scraped >= ?"] + conditions)
+    return db.execute(sql, [time.time() - STORE_MAX_AGE] + args).fetchone()[0]
+
+async def oldest_fresh(tags):
+    """When the oldest fresh question with these tags was scraped, None if there are none."""
+    return await run(read_oldest, tags)
+
+def write_confirmed(db, ids, since, tags, moved, scraped):
+    # Questions known not to have changed are as good as scraped again
+    confirmed = "question_id IN (%s)" % ", ".join("?" * len(ids)) if ids else "0"
+    args = [int(id) for id in ids]
+    if since is not None:
+        conditions, tag_args = tag_conditions(tags)
+        confirmed = "(%s OR (%s))" % (confirmed, " AND ".join(["scraped >= ?"] + conditions))
+        args += [since] + tag_args
+    if moved:
+        confirmed += " AND question_id NOT IN (%s)" % ", ".join("?" * len(moved))
+        args += [int(id) for id in moved]
+    count = db.execute("UPDATE questions SET scraped = ? WHERE " + confirmed, [scraped] + args).rowcount
+    # Answers move the activity of their question, so theirs did not change either
+    db.execute("UPDATE answers SET scraped = ? WHERE question_id IN (SELECT question_id FROM questions WHERE scraped = ?)", (scraped, scraped))
+    return count
+
+async def confirm_questions(ids, since, tags, moved, scraped):
+    """Mark ids, and every question with tags scraped since since, as scraped at scraped, leaving out moved."""
+    return await run(write_confirmed, ids, since, tags, moved, scraped)
+
+def read_answer_ids(db, question_ids):
+    placeholders = ", ".join("?" * len(question_ids))
+    rows = db.execute("SELECT answer_id FROM answers WHERE question_id IN (%s)" % placeholders, [int(id) for id in question_ids])
+    return [str(row[0]) for row in rows]
+
+async def stored_answer_ids(question_ids):
+    if not question_ids:
+        return []
+    return await run(read_answer_ids, question_ids)
+
+def write_listing(db, listing, question_ids, has_more, scraped):
+    db.execute("INSERT OR REPLACE INTO listings VALUES (?, ?, ?)", (listing, int(has_more), scraped))
+    db.execute("DELETE FROM listing_questions WHERE listing = ?", (listing,))
+    db.executemany("INSERT INTO listing_questions VALUES (?, ?, ?)", [(listing, position, id) for position, id in enumerate(question_ids)])
+
+async def save_listing(listing, items, has_more):
+    # items are the start of the listing in its own order
+    scraped = time.time()
+    def write(db):
+        write_questions(db, items, scraped)
+        write_listing(db, listing, [item["question_id"] for item in items], has_more, scraped)
+    await run(write)
+
+def read_listing(db, listing, tags, sort_order, order, min_, max_, start, size):
+    row = db.execute("SELECT has_more FROM listings WHERE listing = ? AND scraped >= ?", (listing, time.time() - STORE_MAX_AGE)).fetchone()
+    if row is None:
+        return None
+    listing_has_more = bool(row[0])
+
+    column = SORT_COLUMNS.get(sort_order)
+    conditions = ["l.listing = ?"]
+    args = [listing]
+    # Questions that lost one of the tags since the listing was crawled are left out
+    for tag in tags:
+        conditions.append("p.question_id IN (SELECT question_id FROM question_tags WHERE tag = ?)")
+        args.append(tag)
+    if column:
+        range_sql, range_args = range_conditions(column, sort_order, None, None, min_, max_)
+        conditions += range_sql
+        args += range_args
+        direction = "DESC" if order == "desc" else "ASC"
+        ordering = "p.%s %s, l.position" % (column, direction)
+    else:
+        ordering = "l.position"
+
+    base = "FROM listing_questions l JOIN questions p ON p.question_id = l.question_id WHERE " + " AND ".join(conditions)
+    end = start + size
+    if listing_has_more:
+        # Only the start of the listing is stored, check that it holds the whole answer
+        stored = db.execute("SELECT COUNT(*) FROM listing_questions WHERE listing = ?", (listing,)).fetchone()[0]
+        if not column or (order == "desc" and not (min_ or max_)):
+            if end > stored:
+                return None
+        elif order == "desc":
+            matching = db.execute("SELECT COUNT(*) " + base, args).fetchone()[0]
+            last = db.execute("SELECT p.%s FROM listing_questions l JOIN questions p ON p.question_id = l.question_id "
+                              "WHERE l.listing = ? ORDER BY l.position DESC LIMIT 1" % column, (listing,)).fetchone()
+            run_ended = min_ and last is not None and last[0] < int(min_)
+            if matching <= end and not run_ended:
+                return None
+            listing_has_more = matching > end
+        else:
+            return None
+
+    rows = db.execute("SELECT p.item " + base + " ORDER BY " + ordering + " LIMIT ? OFFSET ?", args + [size + 1, start]).fetchall()
+    items = [json.loads(row[0]) for row in rows]
+    return items[:size], len(items) > size or (listing_has_more and end >= len(items) + start)
+
+async def query_listing(listing, tags, sort_order, order, min_, max_, start, size):
+    """The page of a stored listing, or None if what is stored cannot answer it."""
+    return await run(read_listing, listing, tags, sort_order, order, min_, max_, start, size)
+
+def read_item(db, table, link, max_age):
+    row = db.execute("SELECT item FROM %s WHERE link = ? AND scraped >= ?" % table, (link, time.time() - max_age)).fetchone()
+    return json.loads(row[0]) if row else None
+
+async def load_owner(link, max_age):
+    return await run(read_item, "owners", link, max_age)
+
+async def save_owner(link, item):
+    await run(lambda db: db.execute("INSERT OR REPLACE INTO owners VALUES (?, ?, ?)", (link, json.dumps(item), time.time())))
+
+def read_collectives(db, max_age):
+    rows = db.execute("SELECT link, item, scraped FROM collectives ORDER BY position").fetchall()
+    if not rows or min(row[2] for row in rows) < time.time() - max_age:
+        return None
+    return [(row[0], json.loads(row[1])) for row in rows], min(row[2] for row in rows)
+
+async def load_collectives(max_age):
+    # The stored catalog and when it was crawled, or None if it is too old
+    return await run(read_collectives, max_age)
+
+async def save_collectives(links, items):
+    scraped = time.time()
+    def write(db):
+        db.execute("DELETE FROM collectives")
+        db.executemany("INSERT INTO collectives VALUES (?, ?, ?, ?)", [
+            (link, position, json.dumps(item), scraped) for position, (link, item) in enumerate(zip(links, items))
+        ])
+    await run(write)
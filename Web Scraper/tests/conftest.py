@@ -0,0 +1,27 @@
+import asyncio
+import os
+import sys
+import pytest
+
+# The modules sit next to this directory, not in a package
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import http_cache
+import rate_limiter
+import replay
+import web_scraper
+from benchmarks.bench_refresh import Site, start_site
+
+@pytest.fixture
+def site(monkeypatch):
+    # A made up site served in place of stackoverflow.com
+    site = Site(5)
+    loop = web_scraper.get_loop()
+    runner, upstream = asyncio.run_coroutine_threadsafe(start_site(site), loop).result()
+    monkeypatch.setattr(replay, "UPSTREAM", upstream)
+    for name in ["RATE_START", "RATE_MAX", "RATE_BURST"]:
+        monkeypatch.setattr(rate_limiter, name, 1000000)
+    yield site
+    http_cache.responses.clear()
+    web_scraper.owner_cache.clear()
+    asyncio.run_coroutine_threadsafe(runner.cleanup(), loop).result()
+    web_scraper.close_session()
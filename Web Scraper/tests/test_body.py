@@ -0,0 +1,26 @@
+import os
+import pytest
+import web_scraper
+from parsing import parse_html
+from benchmarks.bench_body import get_body_reparse
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+def read_fixture(name):
+    with open(os.path.join(FIXTURES, name), encoding="utf-8") as file:
+        return file.read()
+
+def posts(document):
+    # The question and every answer, in the order of the page
+    return [document.find(id="question")] + document.find_all(class_="js-answer")
+
+@pytest.mark.parametrize("parser", ["html.parser", "lxml"])
+def test_body_matches_reparse(parser):
+    page = read_fixture("question_bodies.html")
+    count = len(posts(parse_html(page, parser)))
+    assert count == 3
+    for index in range(count):
+        # Both change the tree they are given, each gets one of its own
+        expected = get_body_reparse(posts(parse_html(page, parser))[index])
+        actual = web_scraper.get_body(posts(parse_html(page, parser))[index])
+        assert actual == expected
@@ -0,0 +1,32 @@
+import asyncio
+import time
+import web_scraper
+
+def test_catalog_entries_are_fetched_again_when_old(monkeypatch):
+    fetched = []
+
+    async def fetch_collective_info(link, session):
+        fetched.append(link)
+        return len(fetched)
+
+    monkeypatch.setattr(web_scraper, "fetch_collective_info", fetch_collective_info)
+    monkeypatch.setattr(web_scraper, "collectives_catalog", {})
+    monkeypatch.setattr(web_scraper, "catalog_fetched", {})
+    lookup = lambda: asyncio.run(web_scraper.get_catalog_collective("/collectives/go", None))
+
+    assert lookup() == 1
+    assert lookup() == 1
+    web_scraper.catalog_fetched["/collectives/go"] = time.time() - web_scraper.COLLECTIVES_REFRESH
+    assert lookup() == 2
+    assert fetched == ["/collectives/go", "/collectives/go"]
+
+def test_old_entry_is_kept_when_fetching_it_fails(monkeypatch):
+    async def fetch_collective_info(link, session):
+        raise RuntimeError("upstream down")
+
+    monkeypatch.setattr(web_scraper, "fetch_collective_info", fetch_collective_info)
+    monkeypatch.setattr(web_scraper, "collectives_catalog", {"/collectives/go": "old"})
+    monkeypatch.setattr(web_scraper, "catalog_fetched", {"/collectives/go": 0})
+    assert asyncio.run(web_scraper.get_catalog_collective("/collectives/go", None)) == "old"
+    # Tried again after the retry delay, not on every lookup
+    assert time.time() - web_scraper.catalog_fetched["/collectives/go"] < web_scraper.COLLECTIVES_REFRESH
@@ -0,0 +1,36 @@
+import base64
+import pytest
+import filters
+from stackoverflow_scraper import app
+
+def encode(text):
+    return "!" + base64.urlsafe_b64encode(text.encode()).decode().rstrip("=")
+
+def test_created_filter_parses_back():
+    filter_ = filters.create(["answer.body"], ["question.title"], "default")
+    assert filters.parse(filter_.name).fields == filter_.fields
+
+@pytest.mark.parametrize("name", [
+    "!!!!",
+    "!",
+    "!abc",
+    "!a b",
+    "!YWJj=",
+    encode(""),
+    encode(";"),
+    encode("question.nothing"),
+    encode("question.title;body"),
+    "!" + base64.urlsafe_b64encode(b"\xff\xfe").decode().rstrip("=")
+])
+def test_malformed_filter_is_rejected(name):
+    with pytest.raises(ValueError):
+        filters.parse(name)
+
+def test_malformed_filter_is_a_bad_parameter():
+    response = app.test_client().get("/questions?site=stackoverflow&filter=!!!!")
+    assert response.status_code == 400
+    assert response.get_json()["error_message"] == "Invalid filter specified"
+
+def test_empty_filter_is_not_created():
+    with pytest.raises(ValueError):
+        filters.create([], [], "none")
@@ -0,0 +1,35 @@
+import asyncio
+import json
+import pytest
+import http_cache
+import sink
+import web_scraper
+from stackoverflow_scraper import app
+
+@pytest.fixture
+def journal(tmp_path, monkeypatch):
+    path = tmp_path / "results.ndjson"
+    monkeypatch.setattr(sink, "SINK", "journal")
+    monkeypatch.setattr(sink, "SINK_PATH", str(path))
+    return path
+
+def recorded(path):
+    # Write out what the sink still holds and read back the journal
+    asyncio.run_coroutine_threadsafe(sink.close(), web_scraper.get_loop()).result()
+    with open(path, encoding="utf-8") as file:
+        return [json.loads(line) for line in file]
+
+@pytest.mark.parametrize("stream", ["ndjson", "json"])
+def test_streamed_questions_are_recorded(site, journal, stream):
+    client = app.test_client()
+    url = "/questions?site=stackoverflow&sort=activity&pagesize=3"
+    assert client.get(url).status_code == 200
+    http_cache.responses.clear()
+    response = client.get(url + "&stream=" + stream)
+    assert response.status_code == 200
+    response.get_data()
+
+    entries = recorded(journal)
+    assert [entry["endpoint"] for entry in entries] == ["question", "question"]
+    assert len(entries[0]["data"]["items"]) == 3
+    assert entries[1]["data"] == entries[0]["data"]
@@ -0,0 +1,40 @@
+import asyncio
+import pytest
+import http_cache
+import store
+import web_scraper
+from benchmarks.bench_refresh import fill, read_all
+
+PARAMS = ["activity", "desc", "1", "30", None, None, None, None, None]
+
+@pytest.fixture(autouse=True)
+def empty_store(tmp_path, monkeypatch):
+    monkeypatch.setattr(store, "STORE_PATH", str(tmp_path / "store.db"))
+
+def scrape(call):
+    return asyncio.run_coroutine_threadsafe(call, web_scraper.get_loop()).result()
+
+@pytest.mark.parametrize("ids, get_ids", [
+    ("1000;1001", web_scraper.get_question_ids),
+    ("10001", web_scraper.get_answer_ids)
+])
+def test_cold_store_default_filter(site, monkeypatch, ids, get_ids):
+    from_store = scrape(get_ids(ids, list(PARAMS), "default"))
+    monkeypatch.setattr(store, "STORE_PATH", "")
+    scraped = scrape(get_ids(ids, list(PARAMS), "default"))
+    assert from_store["items"]
+    assert from_store == scraped
+
+def test_query_posts_without_ids(site):
+    assert scrape(store.query_posts("question", [], "activity", "desc", None, None, None, None, 0, 30)) == ([], False)
+
+def test_refresh_does_not_save_cached_pages(site, monkeypatch):
+    scrape(fill(site.ids))
+    # The pages of the fill are still in the http cache when the question moves
+    site.move(site.ids[:1])
+    scrape(web_scraper.refresh_store(None))
+    from_store = scrape(read_all(site.ids))
+
+    monkeypatch.setattr(store, "STORE_PATH", "")
+    http_cache.responses.clear()
+    assert from_store == scrape(read_all(site.ids))
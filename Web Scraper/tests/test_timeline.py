@@ -0,0 +1,37 @@
+import os
+import pytest
+import web_scraper
+from parsing import parse_html, TIMELINE_PARTS
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+PAGES = ["timeline_question.html", "timeline_answer.html", "timeline_migrated.html"]
+
+def read_fixture(name):
+    with open(os.path.join(FIXTURES, name), encoding="utf-8") as file:
+        return file.read()
+
+def as_dict(record):
+    # Timelines and their events are slotted, compare them by their fields
+    if isinstance(record, list):
+        return [as_dict(item) for item in record]
+    if isinstance(record, (web_scraper.Timeline, web_scraper.TimelineEvent)):
+        return {name: as_dict(getattr(record, name)) for name in record.__slots__}
+    return record
+
+@pytest.mark.parametrize("parser", ["html.parser", "lxml"])
+@pytest.mark.parametrize("name", PAGES)
+def test_strained_timeline_matches_full_parse(name, parser):
+    page = read_fixture(name)
+    full = web_scraper.read_timeline(parse_html(page, parser))
+    strained = web_scraper.read_timeline(parse_html(page, parser, TIMELINE_PARTS))
+    assert as_dict(strained) == as_dict(full)
+    assert full.owner_href is not None or name == "timeline_migrated.html"
+
+@pytest.mark.parametrize("name", PAGES)
+def test_strained_timeline_extracts_the_same(name):
+    page = read_fixture(name)
+    full = web_scraper.read_timeline(parse_html(page))
+    strained = web_scraper.read_timeline(parse_html(page, parse_only=TIMELINE_PARTS))
+    assert web_scraper.get_timeline_info(strained, True) == web_scraper.get_timeline_info(full, True)
+    assert web_scraper.get_answers_timeline(strained, True, True) == web_scraper.get_answers_timeline(full, True, True)
+    assert web_scraper.get_timeline_owner(strained).to_item() == web_scraper.get_timeline_owner(full).to_item()
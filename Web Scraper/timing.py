@@ -0,0 +1,102 @@
+import asyncio
+import contextvars
+import functools
+import threading
+import time
+
+# Where the time of one request went, asked for with ?timing=1. The
+# request's Timings travel with it through contextvars, into the tasks
+# and threads the scraper starts for it
+
+STAGES = {
+    "rate_limit": "Waiting on the rate governor",
+    "queue": "Waiting for a request slot",
+    "network": "Upstream requests",
+    "parse": "Parsing pages",
+    "extract": "Reading fields from pages",
+    "timeline": "Reading timelines",
+    "owner": "Owner lookups",
+    "collectives": "Collective lookups",
+    "serialize": "Encoding the response"
+}
+
+# Extractors timed by metrics.timed that count as a stage of their own
+EXTRACTOR_STAGES = {
+    "parse_html": "parse",
+    "read_timeline": "timeline",
+    "get_timeline_info": "timeline",
+    "get_answers_timeline": "timeline"
+}
+
+current = contextvars.ContextVar("timings", default=None)
+
+class Timings:
+    """Seconds spent and times entered of every stage, summed over the concurrent work of a request."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.stages = {}
+        self.lock = threading.Lock()
+
+    def add(self, stage, seconds):
+        with self.lock:
+            total, count = self.stages.get(stage, (0.0, 0))
+            self.stages[stage] = (total + seconds, count + 1)
+
+    def header(self):
+        # Server-Timing, stages overlap since fetches run side by side
+        entries = []
+        with self.lock:
+            stages = dict(self.stages)
+        for stage in STAGES:
+            if stage in stages:
+                total, count = stages[stage]
+                entries.append('%s;dur=%.1f;desc="%s (%d)"' % (stage, total * 1000, STAGES[stage], count))
+        entries.append("total;dur=%.1f" % ((time.perf_counter() - self.started) * 1000))
+        return ", ".join(entries)
+
+    def debug(self):
+        with self.lock:
+            stages = dict(self.stages)
+        return {
+            "total_ms": round((time.perf_counter() - self.started) * 1000, 1),
+            "stages": {stage: {"ms": round(total * 1000, 1), "count": count} for stage, (total, count) in stages.items()}
+        }
+
+def background(coro):
+    # Start a long-lived task in an empty context, the request that happens
+    # to start it does not get its time and is not kept alive by it
+    return contextvars.Context().run(asyncio.ensure_future, coro)
+
+def start():
+    timings = Timings()
+    current.set(timings)
+    return timings
+
+def add(stage, seconds):
+    timings = current.get()
+    if timings is not None:
+        timings.add(stage, seconds)
+
+class stage:
+    """Time the block inside with as stage of the current request."""
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+
+    def __exit__(self, *exc_info):
+        add(self.name, time.perf_counter() - self.started)
+
+def timed(name):
+    # Decorator for the coroutines that make up a stage, lookups that fetch
+    # count their fetches in their own time as well
+    def decorate(function):
+        @functools.wraps(function)
+        async def wrapper(*args, **kwargs):
+            with stage(name):
+                return await function(*args, **kwargs)
+        return wrapper
+    return decorate
@@ -1,147 +1,306 @@
 import aiohttp
 import asyncio
-import aiofiles
 import backoff
 import re
 from datetime import datetime, timezone
+from types import MappingProxyType
 from tqdm.asyncio import tqdm as async_tqdm
-from bs4 import BeautifulSoup
-import json
 from urllib.parse import urlparse
 import time
-
-# Create a semaphore to limit the number of concurrent requests
-semaphore = asyncio.Semaphore(50)  # Number of concurrent requests
-RATE_LIMIT_PERIOD = 60  # Rate limit period in seconds
-last_request_time = time.time()
+import os
+import threading
+import functools
+import logging
+from pipeline import run_pipeline
+from rate_limiter import get_governor, get_rates, parse_retry_after
+from cache import TTLCache
+import http_cache
+import sink
+import store
+import singleflight
+import replay
+import metrics
+import timing
+from parsing import parse_page, TIMELINE_PARTS, PROFILE_PARTS
+from records import Question, Answer, Owner, Collective
+import filters
+from query import Query, SORT_KEYS
+from bs4 import NavigableString
+
+logger = logging.getLogger(__name__)
+
+# Create a semaphore to limit the number of concurrent requests, it is
+# made again for every scraper loop since it belongs to the loop it is used on
+CONCURRENT_REQUESTS = 50  # Number of concurrent requests
+semaphore = asyncio.Semaphore(CONCURRENT_REQUESTS)
+
+# Connection pool settings for the shared upstream session
+POOL_LIMIT = int(os.getenv('STACKOVERFLOW_POOL_LIMIT', 100))  # Total open connections
+POOL_LIMIT_PER_HOST = int(os.getenv('STACKOVERFLOW_POOL_LIMIT_PER_HOST', 50))  # Open connections per host
+POOL_DNS_CACHE_TTL = int(os.getenv('STACKOVERFLOW_POOL_DNS_TTL', 300))  # Seconds to cache DNS lookups
+POOL_KEEPALIVE_TIMEOUT = int(os.getenv('STACKOVERFLOW_POOL_KEEPALIVE', 30))  # Seconds to keep idle connections
+
+# Parsed owner profiles keyed by the link of the user
+OWNER_CACHE_SIZE = int(os.getenv('STACKOVERFLOW_OWNER_CACHE_SIZE', 10000))  # Number of profiles to keep
+OWNER_CACHE_TTL = int(os.getenv('STACKOVERFLOW_OWNER_CACHE_TTL', 3600))  # Seconds before a profile is fetched again
+owner_cache = TTLCache(OWNER_CACHE_SIZE, OWNER_CACHE_TTL)
+
+# Collectives keyed by the href of their home page, refreshed in the background
+COLLECTIVES_REFRESH = int(os.getenv('STACKOVERFLOW_COLLECTIVES_REFRESH', 6 * 3600))  # Seconds between refreshes
+COLLECTIVES_RETRY = 60  # Seconds before trying again after a failed refresh
+collectives_catalog = {}
+catalog_fetched = {}  # Hrefs to the time their entry was fetched
+catalog_order = []  # Hrefs in the order of /collectives-all
+catalog_updated = 0
+catalog_refresh = None
+catalog_refresher = None
+
+# Snapshots of the most requested listings, crawled again in the background
+# when turned on, only the configured listings are warmed
+WARM_TABS = [tab for tab in os.getenv('STACKOVERFLOW_WARM_TABS', '').split(',') if tab]  # e.g. "hot,week,month"
+WARM_TAGGED = [query for query in os.getenv('STACKOVERFLOW_WARM_TAGGED', '').split(',') if query]  # "tag;tag" or "tag;tag:sort"
+WARM_INTERVAL = int(os.getenv('STACKOVERFLOW_WARM_INTERVAL', 0))  # Seconds between refreshes, 0 keeps warming off
+WARM_SIZE = 100  # Questions kept of every listing, the largest page size a request may ask for
+WARM_MAX_AGE = 3 * WARM_INTERVAL  # Older snapshots are not served, the warmer has fallen behind
+snapshots = {}
+warmer = None
+
+# The store is kept fresh by walking the listing of recently active
+# questions and scraping again only the stored ones whose activity moved
+REFRESH_INTERVAL = int(os.getenv('STACKOVERFLOW_REFRESH_INTERVAL', 0))  # Seconds between refreshes, 0 keeps them off
+REFRESH_TAGGED = [tags for tags in os.getenv('STACKOVERFLOW_REFRESH_TAGGED', '').split(',') if tags]  # "tag;tag" listings to walk instead of all questions
+REFRESH_PAGES = int(os.getenv('STACKOVERFLOW_REFRESH_PAGES', 20))  # Listing pages walked in one refresh at most
+REFRESH_SLACK = 60  # Seconds the clocks of the site and the store may disagree by
+refresher = None
+refresh_stats = {
+    "refreshes": 0,
+    "listing_pages": 0,
+    "moved": 0,
+    "confirmed": 0
+}
+
+# Questions per upstream listing page, the largest page size the listings offer
+LISTING_PAGE_SIZE = 50
+
+# Number of workers for every stage of the /questions crawl
+PAGE_WORKERS = int(os.getenv('STACKOVERFLOW_PAGE_WORKERS', 8))  # Question pages
+TIMELINE_WORKERS = int(os.getenv('STACKOVERFLOW_TIMELINE_WORKERS', 8))  # Timelines
+PROFILE_WORKERS = int(os.getenv('STACKOVERFLOW_PROFILE_WORKERS', 8))  # Owner profiles
+
+# The shared session lives on one long-lived event loop so that every
+# request reuses the same keep-alive connections
+scraper_loop = None
+shared_session = None
+loop_lock = threading.Lock()
+
+def get_loop():
+    # Start the scraper event loop in a background thread the first time it is needed
+    global scraper_loop
+    with loop_lock:
+        if scraper_loop is None:
+            reset_loop_state(None)
+            scraper_loop = asyncio.new_event_loop()
+            thread = threading.Thread(target=scraper_loop.run_forever, name="scraper-loop", daemon=True)
+            thread.start()
+    return scraper_loop
+
+async def run_scraper(coro):
+    # Run a scraper coroutine on the scraper loop and wait for its result
+    loop = get_loop()
+    if asyncio.get_running_loop() is loop:
+        return await coro
+    return await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(coro, loop))
+
+def iter_scraper(agen):
+    # Drive an async generator on the scraper loop from a plain generator,
+    # which is what a streamed response is written from
+    loop = get_loop()
+    try:
+        while True:
+            try:
+                yield asyncio.run_coroutine_threadsafe(agen.__anext__(), loop).result()
+            except StopAsyncIteration:
+                return
+    finally:
+        asyncio.run_coroutine_threadsafe(agen.aclose(), loop).result()
+
+async def stream_result(coro, trailer):
+    # Stream the items of an endpoint that only knows them once all of them
+    # are scraped, everything else in its response goes in the trailer
+    data = await coro
+    if isinstance(data, dict):
+        for item in data.get("items", []):
+            yield item
+        trailer.update({key: value for key, value in data.items() if key != "items"})
+    elif data is not None:
+        trailer["total"] = data
+
+def get_session():
+    # Return the pooled session, creating it on first use
+    global shared_session
+    if shared_session is None or shared_session.closed:
+        connector = aiohttp.TCPConnector(
+            limit=POOL_LIMIT,
+            limit_per_host=POOL_LIMIT_PER_HOST,
+            ttl_dns_cache=POOL_DNS_CACHE_TTL,
+            keepalive_timeout=POOL_KEEPALIVE_TIMEOUT
+        )
+        shared_session = aiohttp.ClientSession(connector=connector)
+    return shared_session
+
+def set_loop(loop):
+    # Scrape on a loop that is already running, the one of the ASGI server,
+    # instead of starting one in a thread. None forgets it again
+    global scraper_loop
+    with loop_lock:
+        if loop is not scraper_loop:
+            reset_loop_state(scraper_loop)
+        scraper_loop = loop
+
+def reset_loop_state(old_loop):
+    # The semaphore, the session, the background tasks, the fetches in
+    # flight and the sink all belong to the loop they were made on. Stop
+    # them there and start over, the new loop makes its own on first use
+    global semaphore, shared_session, warmer, refresher, catalog_refresh, catalog_refresher
+    running = old_loop is not None and old_loop.is_running()
+    for task in [warmer, refresher, catalog_refresh, catalog_refresher]:
+        if task is not None and running:
+            old_loop.call_soon_threadsafe(task.cancel)
+    if shared_session is not None and not shared_session.closed and running:
+        asyncio.run_coroutine_threadsafe(shared_session.close(), old_loop)
+    semaphore = asyncio.Semaphore(CONCURRENT_REQUESTS)
+    shared_session = None
+    warmer = refresher = catalog_refresh = catalog_refresher = None
+    singleflight.inflight.clear()
+    sink.reset(old_loop if running else None)
+
+async def shutdown():
+    # Stop the background crawls, write what the sink still holds and close
+    # the store and the pooled session
+    global shared_session
+    for task in [warmer, refresher, catalog_refresher]:
+        if task is not None:
+            task.cancel()
+    await sink.close()
+    store.close()
+    if shared_session is not None and not shared_session.closed:
+        await shared_session.close()
+    shared_session = None
+
+def close_session():
+    # Shut down and stop the scraper loop started by get_loop
+    global scraper_loop
+    if scraper_loop is None or not scraper_loop.is_running():
+        return
+    asyncio.run_coroutine_threadsafe(shutdown(), scraper_loop).result(timeout=30)
+    scraper_loop.call_soon_threadsafe(scraper_loop.stop)
+    scraper_loop = None
+
+def collected_metrics():
+    # Values /metrics reads as they are now, next to the counters kept as things happen
+    stats = cache_stats()
+    requests = {}
+    for cache, hits, misses in [("owners", "hits", "misses"), ("http", "hits", "misses"), ("singleflight", "coalesced", "fetches")]:
+        requests[(("cache", cache), ("result", "hit"))] = stats[cache][hits]
+        requests[(("cache", cache), ("result", "miss"))] = stats[cache][misses]
+    return [
+        ("stackoverflow_cache_requests_total", "counter", "Lookups of a cache by whether it answered them, a singleflight hit joined a fetch in flight", requests),
+        ("stackoverflow_upstream_rate", "gauge", "Requests per second the rate governor of a host allows", {
+            (("host", host),): rate for host, rate in get_rates().items()
+        }),
+        ("stackoverflow_snapshot_age_seconds", "gauge", "Seconds since a warm listing was crawled", {
+            (("listing", name),): age for name, age in snapshot_ages().items()
+        }),
+        ("stackoverflow_sink_waiting", "gauge", "Responses waiting to be written by the sink", {
+            (): sink.stats()["waiting"]
+        })
+    ]
+
+def cache_stats():
+    # Hit and miss counters of the caches, used to size them
+    return {
+        "owners": owner_cache.stats(),
+        "http": http_cache.stats(),
+        "singleflight": singleflight.stats()
+    }
 
 async def fatal_code(e):
     return 400 <= e.status < 500 and e.status != 429
 
-@backoff.on_exception(backoff.expo, (aiohttp.ClientError, aiohttp.ClientResponseError), max_time=500, giveup=fatal_code)
 async def get_url(url, session):
+    # Responses that are still fresh are served without asking upstream
+    page = http_cache.get_fresh(url)
+    if page is not None:
+        return page
+
+    # Concurrent callers of the same page wait for one fetch
+    return await singleflight.share(singleflight.normalize_url(url), lambda: fetch_url(url, session))
+
+def count_retry(details):
+    metrics.inc("stackoverflow_upstream_retries_total")
+
+@backoff.on_exception(backoff.expo, (aiohttp.ClientError, aiohttp.ClientResponseError), max_time=500, giveup=fatal_code, on_backoff=count_retry)
+async def fetch_url(url, session):
+    headers, cached = http_cache.conditional_headers(url)
+
+    # Wait for the host's rate governor before taking a slot, so a pause
+    # after a 429 never holds on to one of the concurrent requests
+    governor = get_governor(url)
+    waited = time.perf_counter()
+    await governor.acquire()
+    elapsed = time.perf_counter() - waited
+    metrics.observe("stackoverflow_rate_limit_wait_seconds", elapsed)
+    timing.add("rate_limit", elapsed)
+
+    waited = time.perf_counter()
     async with semaphore:  # Limit concurrent requests
-        global last_request_time
-        now = time.time()
-        elapsed = now - last_request_time
-        
-        # Sleep to maintain rate limit
-        if elapsed < RATE_LIMIT_PERIOD / semaphore._value:
-            await asyncio.sleep(RATE_LIMIT_PERIOD / semaphore._value - elapsed)
-        
-        last_request_time = time.time()
-
-        async with session.get(url) as response:
-            if response.status == 429:
-                retry_after = int(response.headers.get("Retry-After", 60))
-                await asyncio.sleep(retry_after)
-                raise aiohttp.ClientResponseError(
-                    request_info=response.request_info,
-                    history=response.history,
-                    code=response.status,
-                    message=response.reason,
-                    headers=response.headers
-                )
-            if response.status >= 400:
-                response.raise_for_status()
-            return await response.text()
-
-
-async def create_json(list, filter_):
-    tags = list[0]
-    question_string = list[1]
-    question_link = list[2]
-    question_id = list[3]
-    score = list[4]
-    answer_count = list[5]
-    view_count = list[6]
-    accepted_answer_id = list[7]
-    is_answered = list[8]
-    creation_date = list[9]
-    activity_date = list[10]
-    edited_date = list[11]
-    content_license = list[12]
-    community_wiki_date = list[13]
-    protected_date = list[14]
-    locked_date = list[15]
-    closed_date = list[16]
-    closed_reason = list[17]
-    bounty_date = list[18]
-    bounty_amount = list[19]
-    owner = list[20]
-    migrated_date = list[21]
-    migrated_question_id = list[22]
-    migrated_url = list[23]
-    
+        elapsed = time.perf_counter() - waited
+        metrics.observe("stackoverflow_semaphore_wait_seconds", elapsed)
+        timing.add("queue", elapsed)
+        with timing.stage("network"):
+            async with session.get(replay.upstream_url(url), headers=headers) as response:
+                metrics.inc("stackoverflow_upstream_fetches_total", url_class=http_cache.url_class(url), status=str(response.status))
+                if response.status == 429:
+                    metrics.inc("stackoverflow_upstream_throttled_total")
+                    governor.throttled(parse_retry_after(response.headers.get("Retry-After")))
+                    raise aiohttp.ClientResponseError(
+                        request_info=response.request_info,
+                        history=response.history,
+                        code=response.status,
+                        message=response.reason,
+                        headers=response.headers
+                    )
+                if response.status == 304 and cached:
+                    governor.succeeded()
+                    return http_cache.revalidated(url, cached)
+                if response.status >= 400:
+                    response.raise_for_status()
+                governor.succeeded()
+                body = await response.read()
+                metrics.inc("stackoverflow_upstream_bytes_total", len(body))
+                page = body.decode(response.get_encoding())
+        http_cache.store(url, page, response.headers)
+    await replay.record(url, page)
+    return page
 
-    if len(owner) > 1:
-        user_info = {
-            "account_id": owner[0],
-            "reputation": owner[1],
-            "user_id": owner[2],
-            "user_type": owner[3],
-            "profile_image": owner[4],
-            "display_name": owner[5],
-            "link": owner[6]
-        }
-    else:
-        user_info = {
-            "user_type": "does_not_exist",
-            "display_name": owner[0]
-        }
-    if migrated_url:
-        other_site = {
-            "site_url": migrated_url
-        }
-        
-        migrated_from = {
-            "other_site": other_site,
-            "on_date": migrated_date,
-            "question_id": migrated_question_id
-        }
-    item = {
-        "tags": tags
+
+async def get_questions_info(question, session, q_id, filter_):
+    state = {
+        "question": question,
+        "q_id": q_id
     }
-    if migrated_url:
-        item["migrated_from"] = migrated_from
-    item["owner"] = user_info
-    item["is_answered"] = is_answered
-    item["view_count"] = int(view_count)
-    if bounty_amount is not None:
-        item["bounty_amount"] = int(bounty_amount)
-    if bounty_date is not None:
-        item["bounty_closes_date"] = bounty_date
-    if protected_date is not None:
-        item["protected_date"] = protected_date
-    if closed_date is not None:
-        item["closed_date"] = closed_date
-    if accepted_answer_id is not None:
-        item["accepted_answer_id"] = int(accepted_answer_id)
-    item["answer_count"] = int(answer_count)
-    if community_wiki_date is not None:
-        item["community_owned_date"] = community_wiki_date
-    item["score"] = int(score)
-    if locked_date is not None:
-        item["locked_date"] = locked_date
-    item["last_activity_date"] = activity_date
-    item["creation_date"] = int(creation_date)
-    if edited_date != creation_date:
-        item["last_edit_date"] = edited_date
-    item["question_id"] = int(question_id)
-    # if content_license is not None:
-    #     item["content_license"] = content_license
-    item["link"] = question_link
-    if closed_reason is not None:
-        item["closed_reason"] = closed_reason
-    item["title"] = question_string
-    if filter_ == "withbody":
-        item["body"] = list[24]
+    for stage in [question_page_stage, question_timeline_stage, question_owner_stage]:
+        state = await stage(state, session, filter_)
+        if state is None:
+            return None
 
-    return item
+    return state["record"]
 
-async def get_questions_info(question, session, q_id, filter_):
-    list = []
-    
+# The question crawl is split into stages so that the listing pipeline can
+# run each stage with its own pool of workers
+
+async def question_page_stage(state, session, filter_):
+    question = state["question"]
     individual_question = question.find(class_="s-post-summary--content-title")
     if individual_question:
         link = individual_question.find('a')
@@ -149,81 +308,84 @@ async def get_questions_info(question, session, q_id, filter_):
         url = "https://stackoverflow.com" + href
 
         page = await get_url(url, session)
-        doc = BeautifulSoup(page, "html.parser")
+        doc = await parse_page(page)
     else:
         doc=question
 
+    state["doc"] = doc
+    return state
+
+async def question_timeline_stage(state, session, filter_):
+    question = Question()
+    doc = state["doc"]
+
     # Get the tags of the question
-    tags = get_tags(doc)
-    list.append(tags)
+    question.tags = get_tags(doc)
 
     # Get the title and link of the question
-    question_string, question_link = get_title(doc)
-    list.append(question_string)
-    list.append(question_link)
+    question.title, question.link = get_title(doc)
 
     # Get the question id
     question_id = get_q_id(doc)
-    list.append(question_id)
-    if q_id:
-        if question_id != q_id:
+    question.question_id = question_id
+    if state["q_id"]:
+        if question_id != state["q_id"]:
             return None
 
     # Get the score, number of answers and number of views
-    score, num_answers, num_views, accepted_answer_id, is_answered = get_stats(doc)
-    list.append(score)
-    list.append(num_answers)
-    list.append(num_views)
-    list.append(accepted_answer_id)
-    list.append(is_answered)
+    question.score, question.answer_count, question.view_count, question.accepted_answer_id, question.is_answered = get_stats(doc)
 
     # Get the creation, last edited and last activity date
-    creation_date, activity_date, edited_date = get_dates(doc)
-    list.append(creation_date)
-    list.append(activity_date)
-    list.append(edited_date)
+    question.creation_date, question.last_activity_date, question.last_edit_date = get_dates(doc)
 
     # Check if the question is a community wiki
     is_wiki = get_is_wiki(doc)
     
-    if filter_ == "withbody":
-        withbody = get_body(doc)
+    if filters.includes(filter_, "question", "body"):
+        question.body = get_body(doc)
+
+    # Get bounty information
+    question.bounty_closes_date, question.bounty_amount = get_bounty(doc)
+
+    state["record"] = question
+    state["timeline"] = None
+    state["migrated_revision_link"] = None
+
+    # Only fetch the timeline if the filter asks for a field on it
+    if not filters.needs(filter_, "question", "timeline"):
+        return state
 
     # Create a b4s object containing the timeline
     url = "https://stackoverflow.com/posts/" + question_id + "/timeline"
     page = await get_url(url, session)
-    timeline_page = BeautifulSoup(page, "html.parser")
+    timeline = read_timeline(await parse_page(page, TIMELINE_PARTS))
 
     # Get all the information available on the timeline
-    content_license, community_wiki_date, protected_date, locked_date, closed_date, closed_reason, migrated_date, migrated_question_id, migrated_url, migrated_revision_link = get_timeline_info(timeline_page, is_wiki)
+    content_license, community_wiki_date, protected_date, locked_date, closed_date, closed_reason, migrated_date, migrated_question_id, migrated_url, migrated_revision_link = get_timeline_info(timeline, is_wiki)
     if is_wiki and not community_wiki_date:
-        community_wiki_date = creation_date
+        community_wiki_date = question.creation_date
         
-    list.append(content_license)
-    list.append(community_wiki_date)
-    list.append(protected_date)
-    list.append(locked_date)
-    list.append(closed_date)
-    list.append(closed_reason)
-
-    # Get bounty information
-    bounty_date, bounty_amount = get_bounty(doc)
-    list.append(bounty_date)
-    list.append(bounty_amount)
-
+    question.content_license = content_license
+    question.community_owned_date = community_wiki_date
+    question.protected_date = protected_date
+    question.locked_date = locked_date
+    question.closed_date = closed_date
+    question.closed_reason = closed_reason
+    question.migrated_date = migrated_date
+    question.migrated_question_id = migrated_question_id
+    question.migrated_url = migrated_url
+
+    state["timeline"] = timeline
+    state["migrated_revision_link"] = migrated_revision_link
+    return state
+
+async def question_owner_stage(state, session, filter_):
     # Get the owner information
-    owner = await get_owner_info(timeline_page, session, migrated_revisions_link=migrated_revision_link)
-    list.append(owner)
-    
-    list.append(migrated_date)
-    list.append(migrated_question_id)
-    list.append(migrated_url)
-    
-    if filter_ == "withbody":
-        list.append(withbody)
-    
-    return list
+    if filters.needs(filter_, "question", "profile"):
+        state["record"].owner = await get_owner_info(state["timeline"], session, migrated_revisions_link=state["migrated_revision_link"])
+    return state
 
+@metrics.timed
 def get_tags(document):
     tags = []
     doc = document.find(id="question").find_all(class_="d-inline mr4 js-post-tag-list-item")
@@ -231,6 +393,7 @@ def get_tags(document):
         tags.append(tag.get_text(strip=True))
     return tags
 
+@metrics.timed
 def get_title(document):
     title = document.find(id="question-header").find(class_="question-hyperlink")
     title_string = title.get_text(strip=True)
@@ -243,6 +406,7 @@ def get_title(document):
     title_string = replace_strings(title_string)
     return title_string, title_link
 
+@metrics.timed
 def get_q_id(document):
     # Find the script tag containing the questionId
     script_tag = document.find('script', text=lambda t: t and 'StackExchange.question.init' in t)
@@ -254,6 +418,7 @@ def get_q_id(document):
     return question_id
     
 
+@metrics.timed
 def get_stats(document):
     # Get the score of the question
     score = document.find(class_="js-vote-count flex--item d-flex fd-column ai-center fc-theme-body-font fw-bold fs-subheading py4")
@@ -292,6 +457,7 @@ def get_stats(document):
     
     return score, num_answers, num_views, accepted_answer_id, is_answered
 
+@metrics.timed
 def get_is_wiki(document):
     is_wiki = False
     wiki = document.find(id="question").find(class_="community-wiki")
@@ -300,29 +466,76 @@ def get_is_wiki(document):
 
     return is_wiki
 
+@metrics.timed
 def get_body(document):
     body = document.find(class_="s-prose js-post-body")
-    
-    # body = body.decode_contents()
-    for div_tags in body.find_all('div'):
-        div_tags.decompose()
-        
-    for emails in body.find_all(class_="__cf_email__"):
-        r = int(emails.get('data-cfemail').strip()[:2], 16)
-        email = ''.join([chr(int(emails.get('data-cfemail').strip()[i:i+2], 16) ^ r) for i in range(2, len(emails.get('data-cfemail').strip()), 2)])
-        emails.replace_with(email)
 
-    # Extract the HTML content with preserved formatting
-    content = body.decode_contents().lstrip()
-    
-    # Convert to a BeautifulSoup object for formatting
-    soup = BeautifulSoup(content, 'html.parser')
-    
-    # Convert to a string while preserving newlines and HTML tags
-    formatted_content = ''.join(str(tag) for tag in soup)
+    # Drop the divs and decode the cloudflare protected emails in one walk over the body
+    for tag in body.find_all(lambda tag: tag.name == 'div' or "__cf_email__" in tag.get('class', [])):
+        if tag.decomposed:
+            continue
+        if tag.name == 'div':
+            tag.decompose()
+        else:
+            tag.replace_with(decode_cf_email(tag.get('data-cfemail')))
+
+    # Removing tags leaves strings next to each other, so do end tags the
+    # parser ignored, e.g. a </ol> that closes nothing
+    for tag in split_strings(body):
+        join_strings(tag)
+
+    # Serialize the html with preserved formatting. Text directly in the body is
+    # written out as it is and tags as html, which is what serializing and
+    # parsing the contents again used to give, without the second parse
+    parts = []
+    for tag in body.contents:
+        part = str(tag)
+        if not parts and type(tag) is NavigableString:
+            # Leading whitespace is dropped up to the first tag, comment or text
+            part = part.lstrip()
+            if not part:
+                continue
+        parts.append(part)
+    formatted_content = ''.join(parts)
     
     return formatted_content
 
+def split_strings(body):
+    # Tags holding two strings in a row
+    tags = {}
+    for node in body.descendants:
+        if type(node) is NavigableString and type(node.next_sibling) is NavigableString:
+            tags[id(node.parent)] = node.parent
+    return list(tags.values())
+
+def join_strings(tag):
+    # Removing tags leaves strings next to each other. Parsing the body again
+    # used to merge them, and collapse them to one newline or space when they
+    # are only whitespace outside of <pre> and <textarea>
+    preserve = tag.name in ['pre', 'textarea'] or tag.find_parent(['pre', 'textarea'])
+    run = []
+    for child in tag.contents + [None]:
+        if type(child) is NavigableString:
+            run.append(child)
+            continue
+
+        if len(run) > 1:
+            text = ''.join(run)
+            if not preserve and text.translate(ASCII_SPACES) == '':
+                text = '\n' if '\n' in text else ' '
+            run[0].replace_with(NavigableString(text))
+            for string in run[1:]:
+                string.extract()
+        run = []
+
+ASCII_SPACES = {ord(c): None for c in ' \n\t\f\r'}
+
+def decode_cf_email(data):
+    data = data.strip()
+    r = int(data[:2], 16)
+    return ''.join([chr(int(data[i:i+2], 16) ^ r) for i in range(2, len(data), 2)])
+
+@metrics.timed
 def get_dates(document):
     c_date = document.find('time').get('datetime')
     date_of_creation = datetime.strptime(c_date, "%Y-%m-%dT%H:%M:%S").replace(tzinfo=timezone.utc)
@@ -342,12 +555,118 @@ def get_dates(document):
     
     return creation_date, activity_date, edit_date
 
-def get_timeline_info(document, is_wiki):
+class TimelineEvent:
+    """One row of a post timeline."""
+    __slots__ = ["kind", "date", "actor", "comment", "site", "revision_link", "markers", "is_wiki", "has_revision", "has_note"]
+
+class Timeline:
+    """Everything the extractors read from a timeline page."""
+    __slots__ = ["license", "owner_name", "owner_href", "simultaneous", "events"]
+
+# Words looked for in the event type of a row, see read_event
+EVENT_MARKERS = ["protected", "locked", "closed", "reopened", "migrated"]
+
+@metrics.timed
+def read_timeline(document):
+    timeline = Timeline()
+
     # Get the content license
-    content_license = None
-    lice = document.find(class_="subheader mb16 d-flex fd-column h-auto").find('h3').find('a')
-    if lice:
-        content_license = lice.get_text(strip=True)
+    timeline.license = None
+    subheader = document.find(class_="subheader mb16 d-flex fd-column h-auto")
+    if subheader and subheader.find('h3') and subheader.find('h3').find('a'):
+        timeline.license = subheader.find('h3').find('a').get_text(strip=True)
+
+    # Get the owner of the post
+    timeline.owner_name = None
+    timeline.owner_href = None
+    owner = document.find(class_='owner')
+    if owner:
+        timeline.owner_name = owner.get_text(strip=True)
+        timeline.owner_href = owner.get('href')
+
+    timeline.simultaneous = None
+    simultaneous = document.find(class_="simultaneous")
+    if simultaneous:
+        timeline.simultaneous = read_event(simultaneous)
+
+    # Get all the events
+    timeline.events = []
+    event_rows = document.find(class_="event-rows fs-body")
+    if event_rows:
+        timeline.events = [read_event(row) for row in event_rows.find_all('tr')]
+
+    return timeline
+
+def read_event(row):
+    event = TimelineEvent()
+    event.is_wiki = False
+    event.has_revision = False
+    event.has_note = False
+    event_type = None
+    relativetime = None
+    comment = None
+
+    # Walk the row once and pick out everything that is needed
+    for node in row.descendants:
+        if isinstance(node, NavigableString):
+            if node == "Post Made Community Wiki":
+                event.is_wiki = True
+            continue
+
+        classes = node.get('class') or []
+        if event_type is None and "wmn1" in classes:
+            event_type = node
+        if relativetime is None and "relativetime" in classes:
+            relativetime = node
+        if comment is None and "event-comment" in classes:
+            comment = node
+        if "js-load-revision" in classes:
+            event.has_revision = True
+        if "mtn2" in classes:
+            event.has_note = True
+
+    event.date = None
+    if relativetime and relativetime.get('title'):
+        event.date = datetime_to_unix(relativetime.get('title'))
+
+    event.kind = None
+    event.actor = None
+    event.markers = {}
+    if event_type:
+        event.kind = event_type.get_text(strip=True)
+        actor = event_type.find_next_sibling()
+        if actor:
+            event.actor = actor.get_text(strip=True)
+
+        # The first string of the event type that mentions every marker,
+        # "protected" and "unprotected" both mention protected
+        for string in event_type.find_all(string=True):
+            lower = string.lower()
+            for marker in EVENT_MARKERS:
+                if marker in lower and marker not in event.markers:
+                    event.markers[marker] = string.strip()
+
+    event.comment = None
+    event.site = None
+    event.revision_link = None
+    if comment:
+        span = comment.find('span')
+        event.comment = span.get_text(strip=True) if span else comment.get_text(strip=True)
+
+        # A migrated post links to the site it came from and its revisions there
+        if "migrated" in event.markers:
+            site = comment.find('a')
+            if site:
+                event.site = site.get_text(strip=True)
+                revisions = site.find_next_sibling()
+                if revisions:
+                    event.revision_link = revisions.get('href')
+
+    return event
+
+@metrics.timed
+def get_timeline_info(timeline, is_wiki):
+    content_license = timeline.license
     
     community_wiki_date = None
     protected_date = None
@@ -364,76 +683,59 @@ def get_timeline_info(document, is_wiki):
     is_closed = False
     has_higer_content_license = False
     is_migrated = False
-    # Get all the events
-    all_events = document.find(class_="event-rows fs-body").find_all('tr')
-    for i in range(0, len(all_events)):
+    for event in timeline.events:
         # Get the community wiki date
-        if is_wiki:
-            wiki_event = all_events[i].find(string="Post Made Community Wiki")
-            if wiki_event:
-                community_wiki_date = datetime_to_unix(all_events[i].find(class_='relativetime').get('title'))
-                is_wiki = False
+        if is_wiki and event.is_wiki:
+            community_wiki_date = event.date
+            is_wiki = False
                     
-        if all_events[i].find(class_="mtn2") and all_events[i].find(class_="js-load-revision") and not has_higer_content_license:
-            if all_events[i].find(class_="wmn1").get_text(strip=True) == "edited":
+        if event.has_note and event.has_revision and not has_higer_content_license:
+            if event.kind == "edited":
                 content_license = "CC BY-SA 4.0"
 
         # Get protected date if the question is protected
         if not is_protected:
-            content_blocks = all_events[i].find(class_="wmn1")
-            protected_event = content_blocks.find(string=lambda text: "protected" in text.lower())
-            if protected_event:
-                if protected_event.strip() == "protected":
-                    is_protected = True
-                    protected_date = datetime_to_unix(all_events[i].find(class_='relativetime').get('title'))
+            protected_event = event.markers.get("protected")
+            if protected_event == "protected":
+                is_protected = True
+                protected_date = event.date
 
-                elif protected_event.strip() == "unprotected":
-                    is_protected = True
+            elif protected_event == "unprotected":
+                is_protected = True
 
         # Get locked date if the question is locked
         if not is_locked:
-            content_blocks = all_events[i].find(class_="wmn1")
-            locked_event = content_blocks.find(string=lambda text: "locked" in text.lower())
-            if locked_event:
-                if locked_event.strip() == "locked":
-                    is_locked = True
-                    locked_date = datetime_to_unix(all_events[i].find(class_='relativetime').get('title'))
+            locked_event = event.markers.get("locked")
+            if locked_event == "locked":
+                is_locked = True
+                locked_date = event.date
 
-                elif locked_event.strip() == "unlocked":
-                    is_locked = True
+            elif locked_event == "unlocked":
+                is_locked = True
 
         # Get closed date if the question is closed
         if not is_closed:
-            content_blocks = all_events[i].find(class_="wmn1")
-            closed_event = content_blocks.find(string=lambda text: "closed" in text.lower())
-            
-            if closed_event:
-                if closed_event.strip() == "closed":
-                    is_closed = True
-                    content_license = None
-                    has_higer_content_license = True
-                    closed_date = datetime_to_unix(all_events[i].find(class_='relativetime').get('title'))
-                    closed_reason = all_events[i].find(class_="event-comment").find('span').get_text(strip=True)
-                    if "Duplicate" in closed_reason:
-                        closed_reason = "Duplicate"
-
-            opened_event = content_blocks.find(string=lambda text: "reopened" in text.lower())
-            if opened_event:
-                if opened_event.strip() == "reopened":
-                    is_closed = True
+            if event.markers.get("closed") == "closed":
+                is_closed = True
+                content_license = None
+                has_higer_content_license = True
+                closed_date = event.date
+                closed_reason = event.comment
+                if "Duplicate" in closed_reason:
+                    closed_reason = "Duplicate"
+
+            if event.markers.get("reopened") == "reopened":
+                is_closed = True
                     
         if not is_migrated:
-            content_blocks = all_events[i].find(class_="wmn1")
-            migrated_event = content_blocks.find(string=lambda text: "migrated" in text.lower())
-            
-            if migrated_event:
+            if "migrated" in event.markers:
                 is_migrated = True
-                migrated_date = datetime_to_unix(all_events[i].find(class_='relativetime').get('title'))
-                migrated_url = all_events[i].find(class_="event-comment").find('a').get_text(strip=True)
+                migrated_date = event.date
+                migrated_url = event.site
                 if migrated_url == "programmers.stackexchange.com":
                     migrated_url = "softwareengineering.stackexchange.com"
                 migrated_url = "https://" + migrated_url
-                migrated_revision_link = all_events[i].find(class_="event-comment").find('a').find_next_sibling().get('href')
+                migrated_revision_link = event.revision_link
                 parts = migrated_revision_link.split('/')
                 
                 # Iterate through the parts to find the ID
@@ -448,6 +750,7 @@ def datetime_to_unix(date):
     unix_date = int(unix.timestamp())
     return unix_date
 
+@metrics.timed
 def get_bounty(document):
     bounty_date = None
     bounty_amount = None
@@ -465,22 +768,33 @@ def get_bounty(document):
     
     return bounty_date, bounty_amount
 
-async def get_owner_info(document, session, migrated_revisions_link=None):
-    owner = []
+@timing.timed("owner")
+async def get_owner_info(timeline, session, migrated_revisions_link=None):
+    if timeline.owner_href or migrated_revisions_link:
+        cache_keys = []
+        if timeline.owner_href:
+            owner_name = timeline.owner_name
+            owner_link = "https://stackoverflow.com" + timeline.owner_href
+            cache_keys.append(owner_link)
 
-    owner_info = document.find(class_='owner')
-    if owner_info or migrated_revisions_link:
-        if owner_info:
-            owner_name = owner_info.get_text(strip=True)
-            href = owner_info.get('href')
-            owner_link = "https://stackoverflow.com" + href
+            # The same user often owns many posts in one response
+            cached_owner = await find_owner(owner_link)
+            if cached_owner:
+                return cached_owner
 
             page = await get_url(owner_link, session)
-            doc = BeautifulSoup(page, "html.parser")
+            doc = await parse_page(page, PROFILE_PARTS)
         else:
+            # Owners of migrated posts are found through the revisions on the
+            # other site, cache them under that link so it is only followed once
+            cache_keys.append(migrated_revisions_link)
+            cached_owner = await find_owner(migrated_revisions_link)
+            if cached_owner:
+                return cached_owner
+
             owner_link = None
             page = await get_url(migrated_revisions_link, session)
-            doc = BeautifulSoup(page, "html.parser")
+            doc = await parse_page(page)
             
             user_tag = doc.find(class_="d-flex p4 ai-center gs4 bg-blue-100")
             if user_tag:
@@ -490,9 +804,8 @@ async def get_owner_info(document, session, migrated_revisions_link=None):
                 domain = parsed_url.netloc
                 
                 user_link = "https://" + domain + user_href
-                async with aiohttp.ClientSession() as session:
-                    page = await get_url(user_link, session)
-                    doc = BeautifulSoup(page, "html.parser")
+                page = await get_url(user_link, session)
+                doc = await parse_page(page)
                 
                 has_communities = doc.find(class_="flex--item3 fl-shrink0 md:order-last").find(class_="s-card bar-md")
                 if has_communities:
@@ -500,20 +813,23 @@ async def get_owner_info(document, session, migrated_revisions_link=None):
                     for community in communities:
                         if community.find(class_="truncate").get_text(strip=True) == "Stack Overflow":
                             owner_link = community.parent.get('href')
+                            cache_keys.append(owner_link)
+
+                            cached_owner = await find_owner(owner_link)
+                            if cached_owner:
+                                await remember_owner(cache_keys, cached_owner)
+                                return cached_owner
                             
                             page = await get_url(owner_link, session)
-                            doc = BeautifulSoup(page, "html.parser")
+                            doc = await parse_page(page)
                             owner_name = doc.find(class_="lh-xs").get_text(strip=True)
                             # Find the <link> tag with rel="canonical"
                             canonical_link = doc.find('link', rel='canonical')
                             owner_link = canonical_link.get('href')
                             
             if not owner_link:
-                all_events = document.find(class_="event-rows fs-body").find_all('tr')
-                for event in all_events:
-                    if event.find(class_="wmn1").get_text(strip=True) == "asked" or event.find(class_="wmn1").get_text(strip=True) == "answered":
-                        owner.append(event.find(class_="wmn1").find_next_sibling().get_text(strip=True))
-                        
+                owner = get_timeline_owner(timeline)
+                await remember_owner(cache_keys, owner)
                 return owner
 
         # Get the accountId and userId
@@ -533,9 +849,6 @@ async def get_owner_info(document, session, migrated_revisions_link=None):
         rep = rep.find(class_ = "fs-body3 fc-black-600")
         reputation = int(rep.string.replace(",", "").strip())
 
-        owner.append(int(account_id))
-        owner.append(reputation)
-        owner.append(int(user_id))
 
         # Find user_type
         user_type = None
@@ -548,48 +861,79 @@ async def get_owner_info(document, session, migrated_revisions_link=None):
         if not user_type:
             user_type = "registered"
 
-        owner.append(user_type)
-
         # Get profile image
         image_link = doc.find(class_="bar-sm bar-md d-block").get('src')
-        owner.append(image_link)
-
-        owner.append(owner_name)
-        owner.append(owner_link)
-        
-    else:
-        all_events = document.find(class_="event-rows fs-body").find_all('tr')
-        for event in all_events:
-            if event.find(class_="wmn1").get_text(strip=True) == "asked" or event.find(class_="wmn1").get_text(strip=True) == "answered":
-                owner.append(event.find(class_="wmn1").find_next_sibling().get_text(strip=True))
 
+        owner = Owner(account_id=int(account_id), reputation=reputation, user_id=int(user_id), user_type=user_type,
+                      profile_image=image_link, display_name=owner_name, link=owner_link)
+        await remember_owner(cache_keys, owner)
+        return owner
+
+    return get_timeline_owner(timeline)
+
+async def remember_owner(cache_keys, owner):
+    for cache_key in cache_keys:
+        owner_cache.set(cache_key, owner)
+        if store.enabled():
+            await store.save_owner(cache_key, owner.to_item())
+
+async def find_owner(cache_key):
+    # Profiles kept by the store outlive the process, they are used as long as owner_cache would
+    owner = owner_cache.get(cache_key)
+    if owner is None and store.enabled():
+        item = await store.load_owner(cache_key, OWNER_CACHE_TTL)
+        if item:
+            owner = Owner(**item)
+            owner_cache.set(cache_key, owner)
     return owner
 
+def get_timeline_owner(timeline):
+    # Owners without a profile are only known by the name on the timeline
+    for event in timeline.events:
+        if event.kind == "asked" or event.kind == "answered":
+            return Owner(user_type="does_not_exist", display_name=event.actor)
+    return Owner(user_type="does_not_exist")
+
 def replace_strings(text):
     """Replace single quotes with HTML entity in a given text."""
     text = text.replace("'", "&#39;")
     text = text.replace("\"", "&quot;")
     return text
 
-async def get_questions(list_of_params, filter_):
+async def get_questions(list_of_params, filter_, trailer=None):
     if filter_ == "none":
         return {}
-    
-    sort_order = list_of_params[0]
-    order = list_of_params[1]
-    page_number = list_of_params[2]
-    page_size = list_of_params[3]
-    tags  = list_of_params[4]
-    todate = list_of_params[5]
-    fromdate = list_of_params[6]
-    min_ = list_of_params[7]
-    max_ = list_of_params[8]
-    
+
+    if filter_ == "total":
+        session = get_session()
+        page = await get_url(questions_url(list_of_params[0], list_of_params[4]), session)
+        soup = await parse_page(page)
+        num_questions = soup.find(class_="fs-body3 flex--item fl1 mr12 sm:mr0 sm:mb12")
+        if num_questions:
+            number_questions = num_questions.get_text(strip=True)
+            number_questions = re.findall(r'\d', number_questions)
+            number_questions = ''.join(number_questions)
+            return int(number_questions)
+        else:
+            return 1000
+
+    if trailer is None:
+        trailer = {}
+    items = [item async for item in stream_questions(list_of_params, filter_, trailer)]
+    if not trailer:
+        return None
+
+    return {
+        "items": items,
+        "has_more": trailer["has_more"]
+    }
+
+def questions_url(sort_order, tags):
     if tags:
         tags_list = tags.split(';')
-        url = "https://stackoverflow.com/questions/tagged/" + "+".join(tags_list) + "?pagesize=30"
+        url = "https://stackoverflow.com/questions/tagged/" + "+".join(tags_list) + "?pagesize=%d" % LISTING_PAGE_SIZE
     else:
-        url = "https://stackoverflow.com/questions?pagesize=30"
+        url = "https://stackoverflow.com/questions?pagesize=%d" % LISTING_PAGE_SIZE
     
     if sort_order == "hot":
         url = "https://stackoverflow.com/?tab=hot"
@@ -603,66 +947,398 @@ async def get_questions(list_of_params, filter_):
         url += "&tab=newest"
     else:
         url += "&tab=votes"
+    return url
 
+async def stream_questions(list_of_params, filter_, trailer):
+    # The sink gets the response once it is all sent, streamed or not
     items = []
+    async for item in window_questions(list_of_params, filter_, trailer):
+        if sink.enabled():
+            items.append(item)
+        yield item
+    if trailer and sink.enabled():
+        sink.record("question", {
+            "items": items,
+            "has_more": trailer["has_more"]
+        })
+
+async def window_questions(list_of_params, filter_, trailer):
+    # Serve the window from a snapshot if there is one that holds it
+    snapshot = find_snapshot(list_of_params)
+    if snapshot:
+        start = (int(list_of_params[2]) - 1) * int(list_of_params[3])
+        end = start + int(list_of_params[3])
+        for item in snapshot.items[start:end]:
+            yield trim_item(item, filter_, "question")
+        trailer["has_more"] = end < len(snapshot.items) or snapshot.has_more
+        trailer["snapshot_age"] = snapshot.age()
+        return
+
+    if store.enabled():
+        async for item in stored_questions(list_of_params, filter_, trailer):
+            yield item
+        return
+
+    async for item in scrape_questions(list_of_params, filter_, trailer):
+        yield item
+
+async def stored_questions(list_of_params, filter_, trailer):
+    # Answer from the store when it holds enough of the listing, otherwise
+    # scrape the listing, which refreshes the store
+    sort_order, order, page_number, page_size, tags = list_of_params[:5]
+    min_ = list_of_params[7]
+    max_ = list_of_params[8]
+    listing = listing_name(sort_order, tags)
+    tag_list = tags.split(";") if tags and sort_order not in ["hot", "week", "month"] else []
+    start = (int(page_number) - 1) * int(page_size)
 
-    async with aiohttp.ClientSession() as session:
-        page = await get_url(url, session)
-        soup = BeautifulSoup(page, "html.parser")
-        results = soup.find(id="questions")
-        
-        if filter_ == "total":
-            num_questions = soup.find(class_="fs-body3 flex--item fl1 mr12 sm:mr0 sm:mb12")
-            if num_questions:
-                number_questions = num_questions.get_text(strip=True)
-                number_questions = re.findall(r'\d', number_questions)
-                number_questions = ''.join(number_questions)
-                return int(number_questions)
-            else:
-                return 1000
+    stored = await store.query_listing(listing, tag_list, sort_order, order, min_, max_, start, int(page_size))
+    if stored is not None:
+        items, trailer["has_more"] = stored
+        for item in items:
+            yield trim_item(item, filter_, "question")
+        return
 
-        if not results:
-            results = soup.find(id="question-mini-list")
-        
-        if not results:
-            results = soup.find(class_="flush-left js-search-results")
-
-        if results:
-            number_of_pages = 1
-            has_pages = soup.find_all(class_="s-pagination--item js-pagination-item")
-            if has_pages:
-                number_of_pages = int(has_pages[-2].get_text(strip=True))
-            
-            for i in range(1, number_of_pages + 1):
-                questions = results.find_all(class_="js-post-summary")
-                for question in async_tqdm(questions, desc="Processing questions"):
-                    list = await get_questions_info(question, session, None, filter_)
-                    item = await create_json(list, filter_)
-                    items.append(item)
-                
-                if i + 1 <= number_of_pages and list:
-                    paged_url = url + "&page=%d" % (i + 1)
-                    # async with aiohttp.ClientSession() as session:
-                    page = await get_url(paged_url, session)
-                    results = BeautifulSoup(page, "html.parser")
-
-            if sort_order not in ["hot", "week", "month"]:
-                sorted_data = min_and_max(items, sort_order, min_, max_)
-                sorted_data = sort_data(sorted_data, sort_order, order)
-                sorted_data, has_more = pages(sorted_data, page_number, page_size)
-            else:
-                sorted_data, has_more = pages(items, page_number, page_size)
+    # The store keeps withbody items so that they can answer every filter,
+    # any other filter is scraped with only its own fields and not stored
+    if filter_ != "withbody":
+        async for item in scrape_questions(list_of_params, filter_, trailer):
+            yield item
+        return
 
-            data = {
-                "items": sorted_data,
-                "has_more": has_more
-            }
+    items = []
+    async for item in scrape_questions(list_of_params, filter_, trailer):
+        items.append(item)
+        yield dict(item)
+    if not trailer:
+        return
+
+    # A window from the start of the listing in its own order tells the store what the listing holds
+    if start == 0 and (sort_order in ["hot", "week", "month"] or (order == "desc" and not (min_ or max_))):
+        await store.save_listing(listing, items, trailer["has_more"])
+    else:
+        await store.save_posts("question", items)
 
-            async with aiofiles.open("question.json", "w") as file:
-                await file.write(json.dumps(data, indent=4, ensure_ascii=False))
+async def scrape_questions(list_of_params, filter_, trailer):
+    # Yield the questions of the listing as soon as their place in the
+    # response is known, then fill in trailer with has_more
+    sort_order = list_of_params[0]
+    order = list_of_params[1]
+    page_number = list_of_params[2]
+    page_size = list_of_params[3]
+    tags  = list_of_params[4]
+    min_ = list_of_params[7]
+    max_ = list_of_params[8]
+    filter_ = filters.fetching(filter_, "question", sort_fields(sort_order, None, None))
+    url = questions_url(sort_order, tags)
+
+    session = get_session()
+    page = await get_url(url, session)
+    soup = await parse_page(page)
+    results = soup.find(id="questions")
+
+    if not results:
+        results = soup.find(id="question-mini-list")
+    
+    if not results:
+        results = soup.find(class_="flush-left js-search-results")
+
+    if not results:
+        return
+
+    number_of_pages = 1
+    has_pages = soup.find_all(class_="s-pagination--item js-pagination-item")
+    if has_pages:
+        number_of_pages = int(has_pages[-2].get_text(strip=True))
+    
+    # Listing -> question page -> timeline -> owner profile, each stage with its own workers
+    stages = [
+        (functools.partial(question_page_stage, session=session, filter_=filter_), PAGE_WORKERS),
+        (functools.partial(question_timeline_stage, session=session, filter_=filter_), TIMELINE_WORKERS),
+        (functools.partial(question_owner_stage, session=session, filter_=filter_), PROFILE_WORKERS)
+    ]
+    start = (int(page_number) - 1) * int(page_size)
+    window = {
+        "has_more": False
+    }
+
+    if sort_order in ["hot", "week", "month"] or not (min_ or max_):
+        # The listing is already in the order of the sort, only the
+        # questions in the requested window are scraped and every one is
+        # final as soon as it is scraped
+        if order == "asc" and sort_order not in ["hot", "week", "month"]:
+            # Ascending is the listing read back to front
+            total = await count_listing(url, results, number_of_pages, session)
+            skip = max(0, total - start - int(page_size))
+            count = max(0, total - start - skip)
+            summaries = [summary async for summary in get_listing_window(url, results, number_of_pages, skip, count, window, session)]
+            source = iterate(reversed(summaries))
+            window["has_more"] = skip > 0
+        else:
+            source = get_listing_window(url, results, number_of_pages, start, int(page_size), window, session)
+
+        pipeline = run_pipeline(source, stages)
+        async for state in async_tqdm(pipeline, desc="Processing questions"):
+            yield filters.project(state["record"].to_item(filter_), filter_, "question")
+    else:
+        # The questions within min and max are one run of the listing,
+        # stop once past it or once the window is full
+        items = []
+        query = Query(sort_order, order, page_number, page_size, min_=min_, max_=max_)
+        pipeline = run_pipeline(get_listing_window(url, results, number_of_pages, 0, None, window, session), stages)
+        async for state in async_tqdm(pipeline, desc="Processing questions"):
+            item = state["record"].to_item(filter_)
+            if query.matches(item):
+                items.append(item)
+            elif query.below_min(item):
+                break
+            if order == "desc" and len(items) > query.end:
+                break
+        await pipeline.aclose()
+
+        # Only final once they are all in, they can still be reordered
+        sorted_data, window["has_more"] = query.run(items)
+        for item in sorted_data:
+            yield filters.project(item, filter_, "question")
+
+    trailer["has_more"] = window["has_more"]
+
+class Snapshot:
+    """Questions of a listing as of one crawl, read-only mappings that requests get copies of."""
+    __slots__ = ["items", "has_more", "created"]
+
+    def __init__(self, items, has_more):
+        self.items = tuple(MappingProxyType(dict(item)) for item in items)
+        self.has_more = has_more
+        self.created = time.time()
+
+    def age(self):
+        return int(time.time() - self.created)
+
+def snapshot_key(sort_order, tags):
+    # The tabs do not look at tags, the order of the tags does not matter
+    if sort_order in ["hot", "week", "month"] or not tags:
+        return (sort_order, None)
+    return (sort_order, ";".join(sorted(tags.split(";"))))
+
+def listing_name(sort_order, tags):
+    key = snapshot_key(sort_order, tags)
+    return "%s %s" % key if key[1] else key[0]
+
+def find_snapshot(list_of_params):
+    sort_order, order, page_number, page_size, tags = list_of_params[:5]
+    min_ = list_of_params[7]
+    max_ = list_of_params[8]
+    snapshot = snapshots.get(snapshot_key(sort_order, tags))
+    if snapshot is None or snapshot.age() > WARM_MAX_AGE:
+        return None
+
+    # Snapshots hold the start of the listing in its own order, the tabs
+    # are never sorted
+    if sort_order not in ["hot", "week", "month"] and (order != "desc" or min_ or max_):
+        return None
+    end = int(page_number) * int(page_size)
+    if end > len(snapshot.items) and snapshot.has_more:
+        return None
+    return snapshot
+
+def trim_item(item, filter_, kind):
+    # Snapshots and the store hold withbody items, cut down to what filter_ asks for
+    if filter_ == "withbody":
+        return dict(item)
+    if isinstance(filter_, filters.Filter):
+        return filters.project(item, filter_, kind)
+    return {key: value for key, value in item.items() if key != "body"}
+
+def warm_queries():
+    queries = [(tab, None) for tab in WARM_TABS]
+    for query in WARM_TAGGED:
+        tags, _, sort_order = query.partition(":")
+        queries.append((sort_order or "activity", tags))
+    return queries
+
+async def refresh_snapshot(sort_order, tags):
+    list_of_params = [sort_order, "desc", "1", str(WARM_SIZE), tags, None, None, None, None]
+    trailer = {}
+    items = [item async for item in scrape_questions(list_of_params, "withbody", trailer)]
+    if not trailer:
+        return
+
+    # Swap in the new snapshot in one go, requests keep the one they have
+    snapshots[snapshot_key(sort_order, tags)] = Snapshot(items, trailer["has_more"])
+    if store.enabled():
+        await store.save_listing(listing_name(sort_order, tags), items, trailer["has_more"])
+
+def start_warmup():
+    # Start refreshing the snapshots and the store on the scraper loop, from any thread
+    if WARM_INTERVAL > 0 and warm_queries():
+        get_loop().call_soon_threadsafe(start_warmer)
+    if REFRESH_INTERVAL > 0 and store.enabled():
+        get_loop().call_soon_threadsafe(start_refresher)
+
+def start_warmer():
+    global warmer
+    if warmer is None or warmer.done():
+        warmer = timing.background(warmer_loop())
+
+async def warmer_loop():
+    while True:
+        for sort_order, tags in warm_queries():
+            try:
+                await refresh_snapshot(sort_order, tags)
+            except Exception:
+                # Keep serving the old snapshot, it is tried again next round
+                logger.exception("Warming up %s failed", listing_name(sort_order, tags))
+        await asyncio.sleep(WARM_INTERVAL)
+
+def start_refresher():
+    global refresher
+    if refresher is None or refresher.done():
+        refresher = timing.background(refresher_loop())
+
+async def refresher_loop():
+    while True:
+        for tags in REFRESH_TAGGED or [None]:
+            try:
+                await refresh_store(tags)
+            except Exception:
+                # The store keeps what it has, it is tried again next round
+                logger.exception("Refreshing the store for %s failed", tags or "all questions")
+        await asyncio.sleep(REFRESH_INTERVAL)
+
+async def refresh_store(tags):
+    """Scrape again the stored questions with tags whose activity moved since they were scraped."""
+    started = time.time()
+    tag_list = tags.split(";") if tags else []
+    oldest = await store.oldest_fresh(tag_list)
+    if oldest is None:
+        return
+    refresh_stats["refreshes"] += 1
+
+    # Every question active since the oldest fresh one was scraped is on the
+    # listing before it, walk back to there
+    horizon = oldest - REFRESH_SLACK
+    session = get_session()
+    url = questions_url("activity", tags)
+    moved = []
+    unmoved = []
+    complete = False
+    for page_number in range(1, REFRESH_PAGES + 1):
+        summaries = await get_listing_page(url, page_number, session)
+        refresh_stats["listing_pages"] += 1
+        activity = {}
+        for summary in summaries:
+            id, date = summary_activity(summary)
+            if id is None or date is None:
+                continue
+            if date < horizon:
+                complete = True
+                break
+            activity[id] = date
+
+        stored = await store.question_activity(list(activity))
+        for id, date in activity.items():
+            if id not in stored:
+                continue
+            if stored[id] is None or date > stored[id]:
+                moved.append(id)
+            else:
+                unmoved.append(id)
+        if complete or not summaries:
+            complete = True
+            break
+
+    # Only the questions that moved are scraped again, with the answers the
+    # store has of them. Their cached pages are from before the move
+    answer_ids = await store.stored_answer_ids(moved)
+    for id in moved + answer_ids:
+        http_cache.expire("https://stackoverflow.com/questions/" + id)
+        http_cache.expire("https://stackoverflow.com/posts/" + id + "/timeline")
+    items = await asyncio.gather(*[get_question_item(id, session, "withbody") for id in moved], return_exceptions=True)
+    await store.save_posts("question", [item for item in items if isinstance(item, dict)])
+    answers = await asyncio.gather(*[get_answer_item(id, session, "withbody") for id in answer_ids], return_exceptions=True)
+    await store.save_posts("answer", [answer for answer in answers if isinstance(answer, dict)])
+
+    # A walk that reached the horizon saw all activity since, so every fresh
+    # question that did not move is still as it was scraped
+    confirmed = await store.confirm_questions(unmoved, oldest if complete else None, tag_list, moved, started)
+    refresh_stats["moved"] += len(moved)
+    refresh_stats["confirmed"] += confirmed
+
+def summary_activity(summary):
+    # Id and time of the last activity of a question as shown on the listing
+    id = summary.get("data-post-id")
+    if id is None:
+        title = summary.find(class_="s-post-summary--content-title")
+        match = re.search(r"/questions/(\d+)", title.find('a').get('href')) if title else None
+        id = match.group(1) if match else None
+    time_tag = summary.find(class_="s-user-card--time")
+    date = time_tag.find(title=True) if time_tag else None
+    if date is None:
+        return id, None
+    return id, datetime_to_unix(date.get('title'))
+
+def snapshot_ages():
+    return {listing_name(*key): snapshot.age() for key, snapshot in snapshots.items()}
+
+async def iterate(items):
+    for item in items:
+        yield item
+
+async def get_listing_window(url, results, number_of_pages, skip, count, window, session):
+    # Yield count question summaries of the listing starting at skip, or
+    # all of them if count is None. The pages before skip are never fetched
+    # and the next page is only fetched once the pipeline has taken all the
+    # summaries of this one
+    questions = results.find_all(class_="js-post-summary")
+    per_page = len(questions)
+    if not per_page:
+        return
+
+    page_number = skip // per_page + 1
+    offset = skip % per_page
+    if page_number > number_of_pages:
+        return
+    if page_number > 1:
+        questions = await get_listing_page(url, page_number, session)
+
+    while True:
+        for question in questions[offset:]:
+            if count is not None and count <= 0:
+                window["has_more"] = True
+                return
+            yield {
+                "question": question,
+                "q_id": None
+            }
+            if count is not None:
+                count -= 1
+        offset = 0
+
+        if page_number >= number_of_pages or not questions:
+            return
+        if count is not None and count <= 0:
+            # The window ends with this page but there are more after it
+            window["has_more"] = True
+            return
+
+        page_number += 1
+        questions = await get_listing_page(url, page_number, session)
+
+async def get_listing_page(url, page_number, session):
+    paged_url = url + "&page=%d" % page_number
+    page = await get_url(paged_url, session)
+    results = await parse_page(page)
+    return results.find_all(class_="js-post-summary")
+
+async def count_listing(url, results, number_of_pages, session):
+    # Number of questions in the listing, only the last page is fetched
+    per_page = len(results.find_all(class_="js-post-summary"))
+    if number_of_pages <= 1:
+        return per_page
+    last_page = await get_listing_page(url, number_of_pages, session)
+    return (number_of_pages - 1) * per_page + len(last_page)
 
-            return data
-        
 async def get_question_ids(q_id, list_of_params, filter_):
     if filter_ == "none":
         return {}
@@ -676,275 +1352,155 @@ async def get_question_ids(q_id, list_of_params, filter_):
     min_ = list_of_params[7]
     max_ = list_of_params[8]
     
-    items = []
-    all_ids = q_id.split(";")
-    if filter_ != "total":
-        # for id in all_ids:
-        question_id = []
-        for id in async_tqdm(all_ids, desc="Processing questions"):
-            if id not in question_id:
-                url = "https://stackoverflow.com/questions/" + id
-
-                async with aiohttp.ClientSession() as session:
-                    page = await get_url(url, session)
-                    soup = BeautifulSoup(page, "html.parser")
-                
-                    # Get the info
-                    list = await get_questions_info(soup, session, id, filter_)
-                    if list:
-                        item = await create_json(list, filter_)
-                        items.append(item)
-                question_id.append(id)
-
-        sorted_data = from_and_to_date(items, fromdate, todate)
-
-        sorted_data = min_and_max(sorted_data, sort_order, min_, max_)
-
-        sorted_data = sort_data(sorted_data, sort_order, order)
-
-        sorted_data, has_more = pages(sorted_data, page_number, page_size)
+    filter_ = filters.fetching(filter_, "question", sort_fields(sort_order, fromdate, todate))
+    all_ids = unique_ids(q_id)
+    session = get_session()
+    if filter_ != "total" and store.enabled():
+        data = await stored_posts("question", all_ids, list_of_params, filter_, session)
+    elif filter_ != "total":
+        # Fetch all the questions at once, gather keeps the order of the ids
+        items = await async_tqdm.gather(*[get_question_item(id, session, filter_) for id in all_ids], desc="Processing questions")
+        items = [item for item in items if item]
+
+        query = Query(sort_order, order, page_number, page_size, fromdate, todate, min_, max_)
+        sorted_data, has_more = query.run(items)
 
         data = {
-            "items": sorted_data,
+            "items": [filters.project(item, filter_, "question") for item in sorted_data],
             "has_more": has_more
         }
     else:
-        for id in all_ids:
-            if id not in items:
-                url = "https://stackoverflow.com/questions/" + id
-                async with aiohttp.ClientSession() as session:
-                    page = await get_url(url, session)
-                    soup = BeautifulSoup(page, "html.parser")
-                    question_id = get_q_id(soup)
-                    if question_id == id:
-                        items.append(id)
+        exists = await asyncio.gather(*[question_exists(id, session) for id in all_ids])
         data = {
-            "total": len(items)
+            "total": sum(exists)
         }
 
-    async with aiofiles.open("question_ids.json", "w") as file:
-        await file.write(json.dumps(data, indent=4, ensure_ascii=False))
+    sink.record("question_ids", data)
 
     return data
 
-def sort_data(items, sort_order, order):
-    # Sort these values:
-    if sort_order == "votes":
-        if order == "desc":
-            sorted_data = sorted(items, key=lambda x: x['score'], reverse=True)
-        else:
-            sorted_data = sorted(items, key=lambda x: x['score'], reverse=False)
-    elif sort_order == "creation":
-        if order == "desc":
-            sorted_data = sorted(items, key=lambda x: x['creation_date'], reverse=True)
-        else:
-            sorted_data = sorted(items, key=lambda x: x['creation_date'], reverse=False)
-    else:
-        if order == "desc":
-            sorted_data = sorted(items, key=lambda x: x['last_activity_date'], reverse=True)
-        else:
-            sorted_data = sorted(items, key=lambda x: x['last_activity_date'], reverse=False)
+async def stored_posts(kind, all_ids, list_of_params, filter_, session):
+    # The store sorts, bounds and pages the posts, only the ones it does
+    # not hold fresh are scraped into it first
+    sort_order, order, page_number, page_size = list_of_params[:4]
+    fromdate, todate, min_, max_ = list_of_params[5:9]
+    fresh = await store.fresh_ids(kind, all_ids)
+    missing = [id for id in all_ids if id not in fresh]
+    get_item = get_question_item if kind == "question" else get_answer_item
+    if filter_ != "withbody" and missing:
+        # Only withbody items are stored, the missing posts are scraped with
+        # the fields filter_ needs and paged together with the stored ones
+        stored = []
+        if fresh:
+            stored, _ = await store.query_posts(kind, [id for id in all_ids if id in fresh], sort_order, order, None, None, None, None, 0, len(fresh))
+        scraped = await asyncio.gather(*[get_item(id, session, filter_) for id in missing])
+        items = {str(item[kind + "_id"]): item for item in stored}
+        items.update({id: item for id, item in zip(missing, scraped) if item})
+
+        query = Query(sort_order, order, page_number, page_size, fromdate, todate, min_, max_)
+        items, has_more = query.run([items[id] for id in all_ids if id in items])
+        return {
+            "items": [trim_item(item, filter_, kind) for item in items],
+            "has_more": has_more
+        }
 
-    return sorted_data
+    items = await asyncio.gather(*[get_item(id, session, "withbody") for id in missing])
+    await store.save_posts(kind, [item for item in items if item])
 
-def min_and_max(items, sort_order, min_, max_):
-    data = []
-    if min_ or max_:
-        for item in items:
-            if sort_order == "creation":
-                date = item['creation_date']
-                if min_ and max_:
-                    if int(min_) <= int(date) < int(max_):
-                        data.append(item)
-                elif min_:
-                    if int(date) >= int(min_):
-                        data.append(item)
-                else:
-                    if int(date) < int(max_):
-                        data.append(item)
-
-            elif sort_order == "votes":
-                votes = item['score']
-                if min_ and max_:
-                    if int(min_) <= int(votes) <= int(max_):
-                        data.append(item)
-                elif min_:
-                    if int(votes) >= int(min_):
-                        data.append(item)
-                else:
-                    if int(votes) <= int(max_):
-                        data.append(item)
-
-            else:
-                date = item['last_activity_date']
-                if min_ and max_:
-                    if int(min_) <= int(date) < int(max_):
-                        data.append(item)
-                elif min_:
-                    if int(date) >= int(min_):
-                        data.append(item)
-                else:
-                    if int(date) < int(max_):
-                        data.append(item)
-    else:
-        return items
-    
-    return data
+    start = (int(page_number) - 1) * int(page_size)
+    items, has_more = await store.query_posts(kind, all_ids, sort_order, order, fromdate, todate, min_, max_, start, int(page_size))
+    return {
+        "items": [trim_item(item, filter_, kind) for item in items],
+        "has_more": has_more
+    }
 
+def unique_ids(ids):
+    # Split the semicolon separated ids and drop the repeated ones, keeping their order
+    return list(dict.fromkeys(ids.split(";")))
 
-def from_and_to_date(items, fromdate, todate):
-    data = []
-    if fromdate or todate:
-        for item in items:
-            date = item['creation_date']
-            if fromdate and todate:
-                if int(fromdate) <= int(date) < int(todate):
-                    data.append(item)
-            elif fromdate:
-                if int(date) >= int(fromdate):
-                    data.append(item)
-            else:
-                if int(date) < int(todate):
-                    data.append(item)
-    else:
-        return items
+async def get_question_item(id, session, filter_):
+    url = "https://stackoverflow.com/questions/" + id
+    page = await get_url(url, session)
+    soup = await parse_page(page)
 
-    return data
+    # Get the info
+    question = await get_questions_info(soup, session, id, filter_)
+    if question:
+        return question.to_item(filter_)
+    return None
 
-def pages(items, page_number, page_size):
-    data = []
-    has_more = False
-    count = 0
-    page_count = (int(page_size) * int(page_number)) - int(page_size)
-    if items:
-        for i in range(int(page_size)):
-            if (page_count+i) < len(items):
-                data.append(items[page_count + i])
-                count += 1
-
-        if (page_count+count) < len(items):
-            has_more = True
-    
-    return data, has_more
+async def question_exists(id, session):
+    url = "https://stackoverflow.com/questions/" + id
+    page = await get_url(url, session)
+    soup = await parse_page(page)
+    question_id = get_q_id(soup)
+    return question_id == id
+
+def sort_fields(sort_order, fromdate, todate):
+    # Fields a Query reads
+    fields = []
+    if sort_order in SORT_KEYS:
+        fields.append(SORT_KEYS[sort_order])
+    if fromdate or todate:
+        fields.append("creation_date")
+    return fields
 
 # Answer objects
 
-async def create_json_answer(list, filter_):
-    is_accepted = list[0]
-    score = list[1]
-    answer_id = list[2]
-    question_id = list[3]
-    creation_date = list[4]
-    edit_date = list[5]
-    content_license = list[6]
-    activity_date = list[7]
-    community_date = list[8]
-    owner = list[9]
-    recommendations = list[10]
-    collective_posted = list[11]
-
-    if len(owner) > 1:
-        user_info = {
-            "account_id": owner[0],
-            "reputation": owner[1],
-            "user_id": owner[2],
-            "user_type": owner[3],
-            "profile_image": owner[4],
-            "display_name": owner[5],
-            "link": owner[6]
-        }
-    else:
-        user_info = {
-            "user_type": "does_not_exist",
-            "display_name": owner[0]
-        }
-    item = {}
-    if recommendations:
-        item["recommendations"] = recommendations
-    if collective_posted:
-        item["posted_by_collectives"] = collective_posted
-    item["owner"] = user_info
-    item["is_accepted"] = is_accepted
-    if community_date is not None:
-        item["community_owned_date"] = community_date
-    item["score"] = int(score)
-    item["last_activity_date"] = activity_date
-    if edit_date is not None:
-        item["last_edit_date"] = edit_date
-    item["creation_date"] = creation_date
-    item["answer_id"] = int(answer_id)
-    item["question_id"] = int(question_id)
-    # item["content_license"] = content_license
-    if filter_ == "withbody":
-        item["body"] = list[12]
-
-    return item
-
-
 async def get_answer_info(answer, session, q_id, filter_):
-    list = []
-    all_recommendations = []
+    record = Answer()
 
     # Get the stats of the answer object
     is_accepted, score, answer_id, question_id = get_answer_stats(answer)
-    list.append(is_accepted)
-    list.append(score)
-    list.append(answer_id)
-    list.append(question_id)
+    record.is_accepted = is_accepted
+    record.score = score
+    record.answer_id = answer_id
+    record.question_id = question_id
     
     if q_id:
         if question_id != q_id:
             return None
     # Get the creation date and the last edited date
-    edit_date = get_answer_dates(answer)
+    record.last_edit_date = get_answer_dates(answer)
 
     # Check if the answer is community owned
     is_comm = False
     if answer.find(class_="community-wiki"):
         is_comm = True
 
-    # Check if the answer has a collective recommendation
-    recommendations = await get_recommendations(answer, session)
+    if filters.needs(filter_, "answer", "collectives"):
+        # Check if the answer has a collective recommendation
+        record.recommended_by = await get_recommendations(answer, session)
 
-    # Check if the post is posted by a collective
-    collective_posted = await get_posted_by_collective(answer, session)
+        # Check if the post is posted by a collective
+        record.posted_by_collectives = await get_posted_by_collective(answer, session)
 
-    if filter_ == "withbody":
-        withbody = get_body(answer)
+    if filters.includes(filter_, "answer", "body"):
+        record.body = get_body(answer)
+
+    # Only fetch the timeline and the owner if the filter asks for them
+    if not filters.needs(filter_, "answer", "timeline"):
+        return record
 
     # Page into the timeline page
     url = "https://stackoverflow.com/posts/" + answer_id + "/timeline"
-    # async with aiohttp.ClientSession() as session:
     page = await get_url(url, session)
-    document = BeautifulSoup(page, "html.parser")
+    timeline = read_timeline(await parse_page(page, TIMELINE_PARTS))
 
     # Get the info from the timeline
-    creation_date, content_license, activity_date, community_date, recom = get_answers_timeline(document, is_comm, recommendations)
-    list.append(creation_date)
-    list.append(edit_date)
-    list.append(content_license)
-    list.append(activity_date)
-    list.append(community_date)
-
-    owner = await get_owner_info(document, session)
-    list.append(owner)
-
-    if recom:
-        all_recommendations.append(await create_json_collectives(recom, True))
-        list.append(all_recommendations)
-    else:
-        list.append([])
+    creation_date, content_license, activity_date, community_date, recommendation_date = get_answers_timeline(timeline, is_comm, record.recommended_by)
+    record.creation_date = creation_date
+    record.content_license = content_license
+    record.last_activity_date = activity_date
+    record.community_owned_date = community_date
+    record.recommendation_date = recommendation_date
 
-    if collective_posted:
-        list.append(collective_posted)
-    else:
-        list.append([])
-        
-    if filter_ == "withbody":
-        list.append(withbody)
+    if filters.needs(filter_, "answer", "profile"):
+        record.owner = await get_owner_info(timeline, session)
 
-    return list
+    return record
 
+@metrics.timed
 def get_answer_stats(document):
     # Is the answer accepted or not
     is_accepted = False
@@ -962,6 +1518,7 @@ def get_answer_stats(document):
 
     return is_accepted, score, answer_id, question_id
     
+@metrics.timed
 def get_answer_dates(document):
     edit_date = None
     dates = document.find(class_="user-action-time fl-grow1").find(class_="js-gps-track")
@@ -970,72 +1527,68 @@ def get_answer_dates(document):
     return edit_date
 
 async def get_recommendations(document, session):
-    recommendations = []
     if document.find(class_="fc-theme-primary"):
-        recommendations = await get_collectives_info(document, session)
-    return recommendations
+        return await get_collectives_info(document, session)
+    return None
 
 async def get_posted_by_collective(document, session):
     collective_posted = []
     if document.find(class_="s-link s-link__inherit js-gps-track"):
         collective_items = document.find_all(class_="s-link s-link__inherit js-gps-track")
         for item in collective_items:
-            collective_item = await get_collectives_info(item, session)
-            collective_posted.append(await create_json_collectives(collective_item, False))
+            collective_posted.append(await get_collectives_info(item, session))
 
     return collective_posted
 
 
-def get_answers_timeline(document, is_comm, recommendation):
-    content_license = document.find(class_="subheader mb16 d-flex fd-column h-auto").find('h3').find('a').get_text(strip=True)
+@metrics.timed
+def get_answers_timeline(timeline, is_comm, is_recommended):
+    content_license = timeline.license
     
     activity_date = None
     has_recent_activity = False
     community_wiki_date = None
     creation_date = None
-    if document.find(class_="simultaneous"):
-        if document.find(class_="simultaneous").find(class_="wmn1").get_text(strip=True).lower() != "late answers":
-            activity_date = datetime_to_unix(document.find(class_="simultaneous").find(class_="relativetime").get('title'))
-
-    all_events = document.find(class_="event-rows fs-body").find_all('tr')
-    for event in all_events:
-        if event.find(class_="js-load-revision") and not has_recent_activity:
-            if "bot" not in event.find(class_="wmn1").find_next_sibling().get_text(strip=True).lower():
+    recommendation_date = None
+    if timeline.simultaneous:
+        if timeline.simultaneous.kind.lower() != "late answers":
+            activity_date = timeline.simultaneous.date
+
+    for event in timeline.events:
+        if event.has_revision and not has_recent_activity:
+            if "bot" not in event.actor.lower():
                 has_recent_activity = True
-                latest_activity = datetime_to_unix(event.find(class_="relativetime").get('title'))
+                latest_activity = event.date
                 if activity_date:
                     if latest_activity > activity_date:
                         activity_date = latest_activity
                 else:
                     activity_date = latest_activity
-            elif event.find(class_="mtn2"):
+            elif event.has_note:
                 content_license = "CC BY-SA 4.0"
 
-        if is_comm:
-            wiki_event = event.find(string="Post Made Community Wiki")
-            if wiki_event:
-                community_wiki_date = datetime_to_unix(event.find(class_='relativetime').get('title'))
-                is_comm = False
+        if is_comm and event.is_wiki:
+            community_wiki_date = event.date
+            is_comm = False
         
-        if recommendation:
-            if "notice added" in event.find(class_="wmn1").get_text(strip=True):
-                recommendation_date = datetime_to_unix(event.find(class_="relativetime").get('title'))
-                recommendation.append(recommendation_date)
+        # The recommendation dates from the first notice on the answer
+        if is_recommended and recommendation_date is None:
+            if "notice added" in event.kind:
+                recommendation_date = event.date
 
-        if "answered" in event.find(class_="wmn1").get_text(strip=True):
-            creation_date = datetime_to_unix(event.find(class_="relativetime").get('title'))
+        if "answered" in event.kind:
+            creation_date = event.date
     if not activity_date:
         activity_date = creation_date
 
-    return creation_date, content_license, activity_date, community_wiki_date, recommendation
+    return creation_date, content_license, activity_date, community_wiki_date, recommendation_date
 
 async def get_question_ids_answers(q_id, list_of_params, filter_):
     if filter_ == "none":
         return {}
 
-    items = []
-    all_ids = q_id.split(";")
-    total_answers = 0
+    all_ids = unique_ids(q_id)
+    session = get_session()
 
     sort_order = list_of_params[0]
     order = list_of_params[1]
@@ -1045,53 +1598,22 @@ async def get_question_ids_answers(q_id, list_of_params, filter_):
     todate = list_of_params[6]
     min_ = list_of_params[7]
     max_ = list_of_params[8]
+    filter_ = filters.fetching(filter_, "answer", sort_fields(sort_order, fromdate, todate))
 
-    for id in async_tqdm(all_ids, desc="Processing questions answers"):
-    # for id in all_ids:
-        url = "https://stackoverflow.com/questions/" + id
-        async with aiohttp.ClientSession() as session:
-            page = await get_url(url, session)
-            soup = BeautifulSoup(page, "html.parser")
-
-            if filter_ != "total":
-                number_of_pages = 1
-                has_pages = soup.find_all(class_="s-pagination--item")
-                if has_pages:
-                    number_of_pages = int(has_pages[-2].get_text(strip=True))
-                
-                for i in range(1, number_of_pages+1):
-                    answers = soup.find_all(class_ = "js-answer")
-                    
-                    # for answer in async_tqdm(answers, desc="Processing answers"):
-                    for answer in answers:
-                        list = await get_answer_info(answer, session, id, filter_)
-                        if list:
-                            item = await create_json_answer(list, filter_)
-                            items.append(item)
-                    
-                    if i+1 <= number_of_pages and list:
-                        url = "https://stackoverflow.com/questions/" + id + "?page=%d" % (i+1)
-                        # async with aiohttp.ClientSession() as session:
-                        page = await get_url(url, session)
-                        soup = BeautifulSoup(page, "html.parser")
-                                
-                else:
-                    question_id = get_q_id(soup)
-                    if id == question_id:
-                        num_answers = soup.find(id="answers-header").find(class_="mb0").get('data-answercount')
-                        total_answers += int(num_answers)
+    if filter_ != "total":
+        # Fetch the answers of all the questions at once, gather keeps the order of the ids
+        all_answers = await async_tqdm.gather(*[get_question_answer_items(id, session, filter_) for id in all_ids], desc="Processing questions answers")
+        items = [item for answers in all_answers for item in answers]
+    else:
+        all_totals = await asyncio.gather(*[get_question_answer_count(id, session) for id in all_ids])
+        total_answers = sum(all_totals)
     
     if filter_ != "total":
-        sorted_data = from_and_to_date(items, fromdate, todate)
-
-        sorted_data = min_and_max(sorted_data, sort_order, min_, max_)
-
-        sorted_data = sort_data(sorted_data, sort_order, order)
-
-        sorted_data, has_more = pages(sorted_data, page_number, page_size)
+        query = Query(sort_order, order, page_number, page_size, fromdate, todate, min_, max_)
+        sorted_data, has_more = query.run(items)
 
         data = {
-            "items": sorted_data,
+            "items": [filters.project(item, filter_, "answer") for item in sorted_data],
             "has_more": has_more
         }
 
@@ -1100,11 +1622,48 @@ async def get_question_ids_answers(q_id, list_of_params, filter_):
             "total": total_answers
         }
 
-    async with aiofiles.open("question_ids_answers.json", "w") as file:
-        await file.write(json.dumps(data, indent=4, ensure_ascii=False))
+    sink.record("question_ids_answers", data)
 
     return data
 
+async def get_question_answer_items(id, session, filter_):
+    items = []
+    url = "https://stackoverflow.com/questions/" + id
+    page = await get_url(url, session)
+    soup = await parse_page(page)
+
+    number_of_pages = 1
+    has_pages = soup.find_all(class_="s-pagination--item")
+    if has_pages:
+        number_of_pages = int(has_pages[-2].get_text(strip=True))
+        
+    for i in range(1, number_of_pages+1):
+        answers = soup.find_all(class_ = "js-answer")
+
+        # All the answers on the page are processed at the same time
+        records = await asyncio.gather(*[get_answer_info(answer, session, id, filter_) for answer in answers])
+        for record in records:
+            if record:
+                items.append(record.to_item(filter_))
+            
+        if i+1 <= number_of_pages and records and records[-1]:
+            url = "https://stackoverflow.com/questions/" + id + "?page=%d" % (i+1)
+            page = await get_url(url, session)
+            soup = await parse_page(page)
+
+    return items
+
+async def get_question_answer_count(id, session):
+    url = "https://stackoverflow.com/questions/" + id
+    page = await get_url(url, session)
+    soup = await parse_page(page)
+
+    question_id = get_q_id(soup)
+    if id == question_id:
+        num_answers = soup.find(id="answers-header").find(class_="mb0").get('data-answercount')
+        return int(num_answers)
+    return 0
+
 async def get_answer_ids(a_id, list_of_params, filter_):
     if filter_ == "none":
         return {}
@@ -1118,37 +1677,24 @@ async def get_answer_ids(a_id, list_of_params, filter_):
     min_ = list_of_params[7]
     max_ = list_of_params[8]
 
-    items = []
-    all_ids = a_id.split(";")
-
-    # for id in async_tqdm(all_ids, desc="Processing answers"):
-    for id in all_ids:
-        url = "https://stackoverflow.com/questions/" + id
-        async with aiohttp.ClientSession() as session:
-            page = await get_url(url, session)
-            soup = BeautifulSoup(page, "html.parser")
+    filter_ = filters.fetching(filter_, "answer", sort_fields(sort_order, fromdate, todate))
+    all_ids = unique_ids(a_id)
+    session = get_session()
+    if filter_ != "total" and store.enabled():
+        data = await stored_posts("answer", all_ids, list_of_params, filter_, session)
+        sink.record("answer_ids", data)
+        return data
 
-            answer = soup.find(id = "answer-"+id)
-            if answer and filter_ != "total":
-                list = await get_answer_info(answer, session, None, filter_)
-                item = await create_json_answer(list, filter_)
-                items.append(item)
-            
-            elif answer and filter_ == "total":
-                if id not in items:
-                    items.append(id)
+    # Fetch all the answers at once, gather keeps the order of the ids
+    items = await asyncio.gather(*[get_answer_item(id, session, filter_) for id in all_ids])
+    items = [item for item in items if item]
 
     if filter_ != "total":
-        sorted_data = from_and_to_date(items, fromdate, todate)
-
-        sorted_data = min_and_max(sorted_data, sort_order, min_, max_)
-
-        sorted_data = sort_data(sorted_data, sort_order, order)
-
-        sorted_data, has_more = pages(sorted_data, page_number, page_size)
+        query = Query(sort_order, order, page_number, page_size, fromdate, todate, min_, max_)
+        sorted_data, has_more = query.run(items)
 
         data = {
-            "items": sorted_data,
+            "items": [filters.project(item, filter_, "answer") for item in sorted_data],
             "has_more": has_more
         }
 
@@ -1157,84 +1703,134 @@ async def get_answer_ids(a_id, list_of_params, filter_):
             "total": len(items)
         }
 
-    async with aiofiles.open("answer_ids.json", "w") as file:
-        await file.write(json.dumps(data, indent=4, ensure_ascii=False))
+    sink.record("answer_ids", data)
 
     return data
 
+async def get_answer_item(id, session, filter_):
+    url = "https://stackoverflow.com/questions/" + id
+    page = await get_url(url, session)
+    soup = await parse_page(page)
 
-# Get the collectives endpoint
+    answer = soup.find(id = "answer-"+id)
+    if not answer:
+        return None
+    if filter_ == "total":
+        return id
 
-async def create_json_collectives(list, is_recommended):
-    name = list[0]
-    slug = list[1]
-    description = list[2]
-    link = list[3]
-    external_links = list[4]
-    tags = list[5]
+    record = await get_answer_info(answer, session, None, filter_)
+    return record.to_item(filter_)
 
-    if not is_recommended:
-        item = {
-            "tags": tags
-        }
-        item["external_links"] = external_links
-        item["description"] = description
-        item["link"] = link
-        item["name"] = name
-        item["slug"] = slug
-    else:
-        recommendation_date = list[6]
-        collective = {
-            "tags": tags
-        }
-        item = {}
-        collective["external_links"] = external_links
-        collective["description"] = description
-        collective["link"] = link
-        collective["name"] = name
-        collective["slug"] = slug
-        item["collective"] = collective
-        item["creation_date"] = recommendation_date
 
-    return item
+# Get the collectives endpoint
 
+@timing.timed("collectives")
 async def get_collectives_info(collective, session):
-    list = []
-
     link = get_collective_home_info(collective)
+    return await get_catalog_collective(link, session)
+
+async def get_catalog_collective(link, session):
+    # Collectives rarely change, read them from the catalog and only fetch
+    # the ones it does not know yet or has held for longer than a refresh.
+    # The catalog is only crawled in full for /collectives, which starts the
+    # refresher, the entries looked up for answers age on their own
+    info = collectives_catalog.get(link)
+    if info is not None and time.time() - catalog_fetched.get(link, 0) < COLLECTIVES_REFRESH:
+        return info
+    try:
+        fresh = await fetch_collective_info(link, session)
+    except Exception:
+        if info is None:
+            raise
+        # Keep serving the old entry and try again on the next lookup
+        logger.exception("Refreshing collective %s failed", link)
+        catalog_fetched[link] = time.time() - COLLECTIVES_REFRESH + COLLECTIVES_RETRY
+        return info
+    collectives_catalog[link] = fresh
+    catalog_fetched[link] = time.time()
+    return fresh
+
+async def load_collectives_catalog(session):
+    # Concurrent callers share the same refresh
+    global catalog_refresh
+    if catalog_refresh is None or catalog_refresh.done():
+        catalog_refresh = asyncio.ensure_future(refresh_collectives_catalog(session))
+    await asyncio.shield(catalog_refresh)
+
+async def refresh_collectives_catalog(session):
+    global collectives_catalog, catalog_fetched, catalog_order, catalog_updated
+    url = "https://stackoverflow.com/collectives-all"
+    page = await get_url(url, session)
+    soup = await parse_page(page)
 
+    all_collectives = soup.find_all(class_="flex--item s-card bs-sm mb12 py16 fc-black-500")
+    links = [get_collective_home_info(collective) for collective in all_collectives]
+    infos = await asyncio.gather(*[fetch_collective_info(link, session) for link in links])
+
+    # Swap in the new catalog in one go
+    collectives_catalog = dict(zip(links, infos))
+    catalog_order = links
+    catalog_updated = time.time()
+    catalog_fetched = dict.fromkeys(links, catalog_updated)
+    if store.enabled():
+        await store.save_collectives(links, [info.to_item() for info in infos])
+
+async def load_stored_catalog():
+    # A catalog kept by an earlier run is used until it is due for a refresh
+    global collectives_catalog, catalog_fetched, catalog_order, catalog_updated
+    stored = await store.load_collectives(COLLECTIVES_REFRESH)
+    if stored is None:
+        return False
+    entries, scraped = stored
+    collectives_catalog = {link: Collective(**item) for link, item in entries}
+    catalog_order = [link for link, item in entries]
+    catalog_updated = scraped
+    catalog_fetched = dict.fromkeys(catalog_order, scraped)
+    return True
+
+def start_catalog_refresher(session):
+    global catalog_refresher
+    if catalog_refresher is None or catalog_refresher.done():
+        catalog_refresher = timing.background(catalog_refresher_loop(session))
+
+async def catalog_refresher_loop(session):
+    while True:
+        wait = COLLECTIVES_REFRESH - (time.time() - catalog_updated)
+        if wait <= 0:
+            try:
+                await load_collectives_catalog(session)
+                wait = COLLECTIVES_REFRESH
+            except Exception:
+                # Keep serving the old catalog and try again later
+                logger.exception("Refreshing the collectives catalog failed")
+                wait = COLLECTIVES_RETRY
+        await asyncio.sleep(wait)
+
+async def fetch_collective_info(link, session):
     # Page into the collective
     url = "https://stackoverflow.com" + link
-    async with aiohttp.ClientSession() as session:
-        page = await get_url(url, session)
-        document = BeautifulSoup(page, "html.parser")
+    page = await get_url(url, session)
+    document = await parse_page(page)
     
     # Get the external links of the collection
     name, links, slug, description = get_external_links(document)
-    list.append(name)
-    list.append(slug)
-    list.append(description)
-    list.append(link)
-    list.append(links)
 
     # Page to the tags page
     href = document.find(id="community-header").find(class_="ml4 ws-nowrap")
     if href:
         href = href.get('href')
         url = "https://stackoverflow.com" + href
-        async with aiohttp.ClientSession() as session:
-            page = await get_url(url, session)
-            document = BeautifulSoup(page, "html.parser")
+        page = await get_url(url, session)
+        document = await parse_page(page)
 
         tags = await get_collectives_tags(document, href, True, session)
 
     else:
         tags = await get_collectives_tags(document, None, False, session)
 
-    list.append(tags)
-
-    return list
+    return Collective(name=name, slug=slug, description=description, link=link, external_links=links, tags=tags)
 
+@metrics.timed
 def get_collective_home_info(document):
     link = document.find(class_="js-gps-track")
     if not link:
@@ -1243,6 +1839,7 @@ def get_collective_home_info(document):
 
     return link
 
+@metrics.timed
 def get_external_links(document):
     links = []
 
@@ -1291,9 +1888,8 @@ async def get_collectives_tags(document, href, has_link, session):
             
             if i != n_pages+1:
                 url = "https://stackoverflow.com" + href + "&page=%d" % i
-                async with aiohttp.ClientSession() as session:
-                    page = await get_url(url, session)
-                    document = BeautifulSoup(page, "html.parser")
+                page = await get_url(url, session)
+                document = await parse_page(page)
     else:
         tags_location = document.find(id="community-header").find_all(class_="post-tag")
         for tag in tags_location:
@@ -1305,31 +1901,27 @@ async def get_collectives(filter_):
     if filter_ == "none":
         return {}
 
-    items = []
-    url = "https://stackoverflow.com/collectives-all"
-    async with aiohttp.ClientSession() as session:
-        page = await get_url(url, session)
-        soup = BeautifulSoup(page, "html.parser")
-
-    all_collectives = soup.find_all(class_="flex--item s-card bs-sm mb12 py16 fc-black-500")
+    session = get_session()
+    if not catalog_updated and not (store.enabled() and await load_stored_catalog()):
+        await load_collectives_catalog(session)
+    start_catalog_refresher(session)
 
     if filter_ == "total":
         data = {
-            "total": len(all_collectives)
+            "total": len(catalog_order)
         }
         return data
 
-    for collective in all_collectives:
-        list = await get_collectives_info(collective, session)
-        items.append(await create_json_collectives(list, False))
+    items = []
+    for link in catalog_order:
+        items.append(filters.project(collectives_catalog[link].to_item(), filter_, "collective"))
     
     data = {
         "items": items,
         "has_more": False
     }
 
-    async with aiofiles.open("collectives.json", "w") as file:
-        await file.write(json.dumps(data, indent=4, ensure_ascii=False))
+    sink.record("collectives", data)
 
     return data
 